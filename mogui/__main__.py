@@ -21,22 +21,25 @@
 import argparse
 import os
 import sys
+import time
 import warnings
 
 from PyQt5.QtWidgets import QApplication
 
 from mogui.modules import Modulecmd
-from mogui.utils import print_debug, print_error
+from mogui.utils import print_error
 from mogui.qtgui import MoGui
 
 
 def main():
     """MoGui application main entry point"""
+    start_time = time.perf_counter()
     if not os.environ.get("MODULEPATH"):
         warnings.warn("Module search path empty")
 
+    # module command version is checked in background once GUI is shown
     try:
-        modules = Modulecmd()
+        modules = Modulecmd(check_version=False)
     except (
         EnvironmentError,
         FileNotFoundError,
@@ -57,21 +60,43 @@ def main():
     arg_parser.add_argument(
         "-d", "--debug", dest="debug", action="store_true", help="enable debug mode"
     )
+    arg_parser.add_argument(
+        "-1",
+        "--single-run",
+        dest="single_run",
+        action="store_true",
+        help="run module command once per action and produce shell code from the "
+        + "environment change it made",
+    )
+    arg_parser.add_argument(
+        "-c",
+        "--coalesce",
+        dest="coalesce",
+        action="store_true",
+        help="produce shell code for the net environment change made during "
+        + "session, on exit",
+    )
     # manually handle --help option to print usage message on stderr
     if "-h" in sys.argv or "--help" in sys.argv:
         arg_parser.print_help(file=sys.stderr)
         sys.exit(0)
     args = arg_parser.parse_args()
 
-    if args.debug:
-        print_debug(modules)
-
     # Init in Qt gui mode
     app = QApplication(sys.argv)
     app.setApplicationName("MoGui")
 
-    gui = MoGui(modules, shell_out=args.shell_out, debug=args.debug)
+    gui = MoGui(
+        modules,
+        shell_out=args.shell_out,
+        debug=args.debug,
+        single_run=args.single_run,
+        coalesce=args.coalesce,
+        start_time=start_time,
+    )
     gui.show()
+    gui.report_startup_time("window shown")
+    gui.check_modulecmd()
 
     sys.exit(app.exec_())
 
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""MOGUI.CACHE, storage of module command results"""
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def get_cache_dir():
+    """Return path of MoGui cache directory, located in XDG cache directory"""
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "mogui")
+
+
+def read_json_file(path):
+    """Return content of JSON file or None if file cannot be read or parsed"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            content = json.load(file)
+    except (OSError, ValueError):
+        content = None
+    return content
+
+
+def read_cache_entries(path, format_version):
+    """Return entries recorded in cache file, or an empty table if file cannot be
+    read or is not in expected format version"""
+    content = read_json_file(path)
+    if not isinstance(content, dict) or content.get("version") != format_version:
+        return {}
+    return content.get("entries", {})
+
+
+def write_json_file(path, content):
+    """Atomically write content in JSON file. Return False if file cannot be
+    written"""
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique temporary file, as several threads may write same file
+        tmp_fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            prefix=f"{os.path.basename(path)}.",
+            suffix=".tmp",
+        )
+        with os.fdopen(tmp_fd, "w", encoding="utf-8") as file:
+            json.dump(content, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+class AvailCache:
+    """Persistent cache of available modules
+
+    Available modules are recorded for each MODULEPATH value along with the state
+    of modulepaths (see Modulecmd.get_avail_state) when they were fetched.
+
+    Args:
+        path: cache file location
+        max_entries: number of MODULEPATH values to keep results for
+    """
+
+    format_version = 4
+
+    def __init__(self, path=None, max_entries=8):
+        if path is None:
+            path = os.path.join(get_cache_dir(), "avail.json")
+        self.path = path
+        self.max_entries = max_entries
+
+    def read_entries(self):
+        """Return cache entries recorded in cache file"""
+        return read_cache_entries(self.path, self.format_version)
+
+    def load(self, modulepath: str):
+        """Return cached avail state and list of Module attributes for MODULEPATH
+        value or None if nothing is cached"""
+        entry = self.read_entries().get(modulepath)
+        if entry is None:
+            return None
+        return tuple(entry["state"]), entry["modules"]
+
+    def save(self, avail_state: tuple, path_mods: dict):
+        """Record available modules of each modulepath, including those shadowed
+        by a module of same name in a previous modulepath, for MODULEPATH value
+        found in avail state"""
+        entries = self.read_entries()
+        modulepath = avail_state[0]
+        # most recently saved entry is put at the end of the table
+        entries.pop(modulepath, None)
+        entries[modulepath] = {
+            "state": avail_state,
+            "modules": [
+                [
+                    mod.name,
+                    mod.symbols,
+                    mod.modulepath,
+                    mod.tags,
+                    mod.module_type,
+                    mod.pathname,
+                    mod.target,
+                ]
+                for mod_list in path_mods.values()
+                for mod in mod_list
+            ],
+        }
+        for outdated in list(entries)[: -self.max_entries]:
+            del entries[outdated]
+        write_json_file(self.path, {"version": self.format_version, "entries": entries})
+
+
+class TextCache:
+    """In-memory cache of texts produced by module command, like help or display
+    messages. Least recently used texts are evicted once the total length of
+    cached texts exceeds a cap. Cache can be accessed from several threads.
+
+    Args:
+        max_size: maximum total length of cached texts, in characters
+    """
+
+    def __init__(self, max_size=4 * 2**20):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        """Return text cached for key and mark it as recently used, or None if
+        no text is cached"""
+        with self.lock:
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+            return text
+
+    def put(self, key, text: str):
+        """Cache text for key, then evict least recently used texts until cache
+        fits in its cap"""
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            # a text exceeding cap alone is not cached
+            if len(text) > self.max_size:
+                return
+            self.entries[key] = text
+            self.size += len(text)
+            while self.size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class MetadataStore:
+    """Persistent store of module messages that only depend on modulefile, like
+    whatis or help messages, kept in a SQLite database
+
+    Each message is recorded with the stamp of its modulefile (see
+    Module.get_stamp) and is only returned while this stamp is unchanged.
+    Messages of modules without stamp cannot be checked, so they are neither
+    stored nor returned. Store can be accessed from several threads. If
+    database cannot be used, messages are silently not stored.
+
+    Args:
+        path: database file location
+    """
+
+    format_version = 2
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), "metadata.sqlite")
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Return connection to database, opened and initialized on first call,
+        or None if database cannot be used"""
+        if self.connection is None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                version = connection.execute("PRAGMA user_version").fetchone()[0]
+                if version != self.format_version:
+                    connection.execute("DROP TABLE IF EXISTS messages")
+                    connection.execute(
+                        "CREATE TABLE messages (kind TEXT, name TEXT, pathname TEXT,"
+                        " mtime INTEGER, size INTEGER, message TEXT,"
+                        " PRIMARY KEY (kind, name, pathname))"
+                    )
+                    connection.execute(f"PRAGMA user_version = {self.format_version}")
+                    connection.commit()
+            except (OSError, sqlite3.Error):
+                return None
+            self.connection = connection
+        return self.connection
+
+    def get(self, kind: str, name: str, stamp: tuple):
+        """Return message of given kind recorded for module and stamp, or None if
+        no valid message is stored"""
+        if stamp is None:
+            return None
+        pathname, mtime, size = stamp
+        with self.lock:
+            connection = self.connect()
+            if connection is None:
+                return None
+            try:
+                row = connection.execute(
+                    "SELECT message FROM messages WHERE kind = ? AND name = ?"
+                    " AND pathname = ? AND mtime = ? AND size = ?",
+                    (kind, name, pathname, mtime, size),
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        return row[0] if row is not None else None
+
+    def get_all(self, kind: str):
+        """Return hash table of stamp and message of given kind recorded for each
+        module name and modulefile location"""
+        with self.lock:
+            connection = self.connect()
+            if connection is None:
+                return {}
+            try:
+                rows = connection.execute(
+                    "SELECT name, pathname, mtime, size, message FROM messages"
+                    " WHERE kind = ?",
+                    (kind,),
+                ).fetchall()
+            except sqlite3.Error:
+                return {}
+        return {
+            (name, pathname): ((pathname, mtime, size), message)
+            for name, pathname, mtime, size, message in rows
+        }
+
+    def put(self, kind: str, entries: list):
+        """Record messages of given kind, replacing those previously stored for
+        the same modules
+
+        Args:
+            kind: 'whatis' or 'help'
+            entries: list of module name, stamp and message. Entries without
+                stamp are skipped
+        """
+        with self.lock:
+            connection = self.connect()
+            if connection is None:
+                return
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (kind, name, *stamp, message)
+                            for name, stamp, message in entries
+                            if stamp is not None
+                        ],
+                    )
+            except sqlite3.Error:
+                pass
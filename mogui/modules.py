@@ -18,11 +18,25 @@
 
 ##########################################################################
 
+import builtins
 import errno
+import json
 import os
+import queue
 import re
 import sys
-from subprocess import Popen, PIPE
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import DEVNULL, Popen, PIPE
+from types import SimpleNamespace
+
+from mogui.cache import AvailCache, MetadataStore, TextCache
+
+WHATIS_LINE_RE = re.compile(r"^\s*(\S+?):(?: (.*))?$")
+JSON_DECODER = json.JSONDecoder()
+# tags depending on current environment rather than on modulefile
+ENVIRONMENT_TAGS = ["loaded", "auto-loaded"]
 
 
 def get_modulecmd_path():
@@ -45,42 +59,179 @@ def get_modulecmd_path():
     return modulecmd_path
 
 
-def get_path_envvar_value_list(envvar, sep=":"):
-    """Return list value of a path-like environment variable"""
-    if os.environ.get(envvar):
-        value_list = os.environ.get(envvar).split(sep)
+def get_path_envvar_value_list(envvar, sep=":", env=None):
+    """Return list value of a path-like environment variable, defined in given
+    environment or in current environment if env is None"""
+    if env is None:
+        env = os.environ
+    if env.get(envvar):
+        value_list = env.get(envvar).split(sep)
     else:
         value_list = []
     return value_list
 
 
+def get_path_mtime(path):
+    """Return modification time of path or None if path cannot be accessed"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return mtime
+
+
+def parse_whatis(content: str):
+    """Parse whatis output of module command
+
+    Args:
+        content: output of whatis sub-command, for one or several modules
+
+    Returns:
+        Hash table of whatis message per module name. Multiple whatis lines of
+        a module are joined with newline character. When a module name is
+        found in several modulepaths, only the lines of the first modulepath
+        are kept, like for available modules
+    """
+    whatis_dict = {}
+    # modulepath where each module name has first been seen
+    mod_paths = {}
+    modulepath = None
+    for line in (content or "").split("\n"):
+        match = WHATIS_LINE_RE.match(line)
+        # track modulepath header lines
+        if match is None:
+            if line.strip().startswith("-"):
+                modulepath = line.strip("- ")
+            continue
+        mod_name, text = match.groups()
+        # skip lines of a module shadowed by same name in a prior modulepath
+        if mod_paths.setdefault(mod_name, modulepath) != modulepath:
+            continue
+        # whatis line may have no text
+        text = text or ""
+        if mod_name in whatis_dict:
+            whatis_dict[mod_name] += "\n" + text
+        else:
+            whatis_dict[mod_name] = text
+    return whatis_dict
+
+
+def parse_avail_json_line(line: str):
+    """Parse line of avail JSON output of module command, which either opens
+    the result of a modulepath or reports a module entry
+
+    Args:
+        line: line of avail JSON output
+
+    Returns:
+        Tuple of modulepath or module name and module entry, which is None for
+        modulepath lines. None if line does not hold any of them
+    """
+    line = line.strip().lstrip("{,").lstrip()
+    if not line.startswith('"'):
+        return None
+    try:
+        key, end = JSON_DECODER.raw_decode(line)
+        value = line[end:].lstrip()
+        if not value.startswith(":"):
+            return None
+        value = value[1:].strip()
+        if value == "{":
+            return key, None
+        entry, _ = JSON_DECODER.raw_decode(value)
+    except ValueError:
+        return None
+    return key, entry
+
+
+# tuples of interned strings shared by modules having the same symbols or tags
+SHARED_TUPLES = {}
+
+
+def get_shared_tuple(values):
+    """Return tuple of interned strings equal to given values, shared with other
+    callers passing the same values"""
+    if not values:
+        return ()
+    key = tuple(sys.intern(value) for value in values)
+    return SHARED_TUPLES.setdefault(key, key)
+
+
+def get_first_mods(path_mods: dict):
+    """Return hash table of available modules from lists of modules found in each
+    modulepath, in MODULEPATH order. Module found in first modulepath takes
+    precedence over modules of same name in next modulepaths"""
+    avail_mods = {}
+    for mod_list in path_mods.values():
+        for mod in mod_list:
+            if mod.name not in avail_mods:
+                avail_mods[mod.name] = mod
+    return avail_mods
+
+
 def version_tuple(version: str):
     """Convert version string into tuple"""
     return tuple(map(int, (version.split("."))))
 
 
-class Modulecmd:
+class Modulecmd:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """Interact with module command"""
 
-    def __init__(self, shell="python"):
+    # maximum number of modulepaths queried concurrently
+    avail_workers = 4
+
+    def __init__(self, shell="python", check_version=True):
         self.shell = shell
         self.avail_mods = {}
+        # modules of each modulepath, including shadowed ones, to merge results of
+        # modulepaths queried again
+        self.avail_path_mods = {}
+        self.avail_state = None
+        self.avail_cache = AvailCache()
+        # serialize queries updating module state, as they may run concurrently
+        # in worker threads
+        self.state_lock = threading.RLock()
+        # help, display and saveshow messages, kept across available modules fetch
+        self.text_cache = TextCache()
+        # whatis and help messages, kept across sessions
+        self.metadata_store = MetadataStore()
         self.saved_colls = []
+        self.saved_state = None
+        self.whatis_fetched = False
+        # whatis messages of modules loaded from avail cache are restored later
+        self.whatis_restore_pending = False
         self.avail_fetched = False
         self.saved_fetched = False
         self.modulecmd = get_modulecmd_path()
         self.cmd_version = None
 
-        # check Modules is at required version
+        if check_version:
+            self.check_version()
+
+    def check_version(self):
+        """Check Modules is at required version
+
+        Returns:
+            Version of module command
+
+        Raises:
+            RuntimeError: module command is older than required version
+        """
         min_modules_version = "5.2.0"
         if version_tuple(self.version()) < version_tuple(min_modules_version):
             raise RuntimeError(
                 f"Environment Modules version {min_modules_version} or higher "
                 + f"is required. Found version {self.version()}"
             )
+        return self.version()
 
     def run(
-        self, *arguments, out_shell="python", return_content="err", silent_err=False
+        self,
+        *arguments,
+        out_shell="python",
+        return_content="err",
+        silent_err=False,
+        env=None,
     ):
         """Run module command with given arguments to produce code for
         specified output shell.
@@ -90,13 +241,18 @@ class Modulecmd:
             out_shell: shell code kind module should produce
             return_content: return 'out' or 'err' content
             silent_err: drop error output if enabled
+            env: environment to run module command in, current environment if
+                None
 
         Returns:
             Content produced by run commands. Either stdout or stderr content
             base on return_content value.
         """
         with Popen(
-            [self.modulecmd, out_shell] + list(arguments), stdout=PIPE, stderr=PIPE
+            [self.modulecmd, out_shell] + list(arguments),
+            stdout=PIPE,
+            stderr=PIPE,
+            env=env,
         ) as proc:
             out, err = proc.communicate()
 
@@ -113,6 +269,24 @@ class Modulecmd:
             content = err_content
         return content
 
+    def run_lines(self, *arguments, env=None):
+        """Run module command with given arguments and yield lines of its error
+        output as soon as they are produced
+
+        Args:
+            arguments: module command and its arguments to run
+            env: environment to run module command in, current environment if
+                None
+        """
+        with Popen(
+            [self.modulecmd, "python"] + list(arguments),
+            stdout=DEVNULL,
+            stderr=PIPE,
+            env=env,
+            encoding="utf-8",
+        ) as proc:
+            yield from proc.stderr
+
     def eval(self, *arguments):
         """Evaluate content produced by module command run to update current
         environment.
@@ -129,31 +303,371 @@ class Modulecmd:
         _mlstatus = global_ns.get("_mlstatus", True)
         return _mlstatus
 
-    def avail(self, refresh=False):
+    def eval_env(self, *arguments, env: dict):
+        """Evaluate content produced by module command run in given environment,
+        without updating current environment.
+
+        Args:
+            arguments: module command and its argument to run
+            env: environment to run module command in
+
+        Returns:
+            Environment resulting from content evaluation
+        """
+        content = self.run(*arguments, return_content="out", env=env)
+        # evaluated content imports os module: give it a substitute working on a
+        # copy of provided environment
+        env_os = SimpleNamespace(environ=dict(env), chdir=lambda path: None)
+
+        def env_import(name, *args, **kwargs):
+            if name == "os":
+                return env_os
+            return __import__(name, *args, **kwargs)
+
+        global_ns = {"__builtins__": dict(vars(builtins), __import__=env_import)}
+        exec(content, global_ns)  # pylint: disable=exec-used
+        return env_os.environ
+
+    def get_avail_state(self):
+        """Return state of the elements available modules depend on: value of
+        MODULEPATH and modification time of each modulepath directory and of its
+        .modulerc file"""
+        state = [os.environ.get("MODULEPATH", "")]
+        for modulepath in self.used():
+            state.append(get_path_mtime(modulepath))
+            state.append(get_path_mtime(os.path.join(modulepath, ".modulerc")))
+        return tuple(state)
+
+    def get_changed_modulepaths(self, avail_state: tuple):
+        """Return modulepaths whose state differs from the one recorded at last
+        fetch, or None if MODULEPATH value itself changed"""
+        if self.avail_state is None or avail_state[0] != self.avail_state[0]:
+            return None
+        changed = []
+        for i, modulepath in enumerate(self.used()):
+            first, last = 1 + 2 * i, 3 + 2 * i
+            if avail_state[first:last] != self.avail_state[first:last]:
+                changed.append(modulepath)
+        return changed
+
+    @staticmethod
+    def can_split_avail(avail_state: tuple):
+        """Tell if enabled modulepaths can be queried separately, which is the case
+        if none of them has a .modulerc file, as such file may define symbolic
+        versions, aliases or hide directives for modules of other modulepaths"""
+        # .modulerc modification time is every other element after MODULEPATH
+        return all(mtime is None for mtime in avail_state[2::2])
+
+    def avail(
+        self, refresh=False, force=False, modulepaths=(), progress=None
+    ):  # pylint: disable=too-many-arguments
         """Fetch available modules in enabled module search paths
 
+        When MODULEPATH value is unchanged and modulepaths can be queried
+        separately, only the modulepaths that changed are queried again and merged
+        with modules previously found in other paths. Otherwise all modulepaths
+        are queried again if any of them changed.
+
         Args:
-            refresh: fetch modules even if already done
+            refresh: fetch modules again if modulepaths changed since last fetch
+            force: fetch modules again even if modulepaths did not change
+            modulepaths: modulepaths to query again, as their content is known
+                to have changed
+            progress: called regularly with list of modules found so far when
+                all modulepaths are queried
 
         Returns:
             Hash table with all Module objects
         """
-        if not self.avail_fetched or refresh:
-            self.avail_mods = {}
-            lines = self.run("avail", "--terse", "--output=sym").strip().split("\n")
-            for mod in lines:
-                mod_split_raw = mod.rsplit("(", 1)
-                mod_name = mod_split_raw[0]
-                if len(mod_split_raw) > 1:
-                    mod_syms = mod_split_raw[1].rstrip(")").split(":")
+        with self.state_lock:
+            if not self.avail_fetched or refresh or force or modulepaths:
+                avail_state = self.get_avail_state()
+                changed = self.get_changed_modulepaths(avail_state)
+                split = self.can_split_avail(avail_state)
+                if not self.avail_fetched or force or changed is None:
+                    path_mods = self.fetch_avail_paths(self.used(), progress, split)
                 else:
-                    mod_syms = None
-                # modules are correctly sorted in dict, as they are recorded in the natural
-                # sorted order provided by module command
-                self.avail_mods[mod_name] = Module(mod_name, mod_syms)
+                    changed += [path for path in modulepaths if path not in changed]
+                    if split or not changed:
+                        path_mods = self.merge_avail(changed)
+                    else:
+                        path_mods = self.fetch_avail_paths(
+                            self.used(), progress, split=False
+                        )
+                if path_mods is not None:
+                    avail_mods = get_first_mods(path_mods)
+                    whatis_fetched = self.carry_whatis(avail_mods)
+                    self.avail_state = avail_state
+                    self.avail_mods = avail_mods
+                    self.avail_path_mods = path_mods
+                    self.avail_fetched = True
+                    self.whatis_fetched = whatis_fetched
+                    self.whatis_restore_pending = False
+                    self.avail_cache.save(avail_state, path_mods)
+
+            return self.avail_mods
+
+    def carry_whatis(self, avail_mods: dict):
+        """Keep whatis messages previously fetched or stored in metadata store for
+        modules whose modulefile did not change since then, according to its
+        stamp. Drop the others.
+
+        Args:
+            avail_mods: newly fetched available modules
+
+        Returns:
+            True if whatis message of all modules is known
+        """
+        whatis_fetched = True
+        stored = None
+        for mod in avail_mods.values():
+            stamp = mod.get_stamp()
+            # whatis of modules without stamp cannot be checked, it is fetched
+            # again when asked
+            if stamp is None:
+                mod.whatis = None
+                mod.whatis_stamp = None
+                continue
+            previous = self.avail_mods.get(mod.name, mod)
+            if previous.whatis_stamp is not None and previous.whatis_stamp == stamp:
+                mod.whatis = previous.whatis
+                mod.whatis_stamp = previous.whatis_stamp
+                continue
+            # store is read once, when first needed
+            if stored is None:
+                stored = self.metadata_store.get_all("whatis")
+            stored_stamp, whatis = stored.get((mod.name, mod.pathname), (None, None))
+            if stored_stamp == stamp:
+                mod.whatis = whatis or None
+                mod.whatis_stamp = stamp
+            else:
+                mod.whatis = None
+                mod.whatis_stamp = None
+                whatis_fetched = False
+        return whatis_fetched
+
+    def merge_avail(self, modulepaths: list[str]):
+        """Query available modules of given modulepaths and merge them with those
+        previously fetched from other modulepaths, in MODULEPATH order
+
+        Only used when modulepaths can be queried separately (see
+        can_split_avail).
+
+        Returns:
+            Hash table of module list per modulepath, or None if no modulepath is
+            queried
+        """
+        used = self.used()
+        modulepaths = [path for path in modulepaths if path in used]
+        if not modulepaths:
+            return None
+        fetched_mods = self.fetch_avail_paths(modulepaths)
+
+        path_mods = {}
+        for modulepath in used:
+            if modulepath in modulepaths:
+                path_mods[modulepath] = fetched_mods.get(modulepath, [])
+            else:
+                path_mods[modulepath] = self.avail_path_mods.get(modulepath, [])
+        return path_mods
+
+    def load_avail_cache(self):
+        """Set available modules from those recorded in persistent cache for
+        current MODULEPATH value
+
+        Returns:
+            Boolean telling if available modules were found in cache
+        """
+        with self.state_lock:
+            cached = self.avail_cache.load(os.environ.get("MODULEPATH", ""))
+            if cached is None:
+                return False
+            self.avail_state, mod_list = cached
+            path_mods = {}
+            for name, symbols, modulepath, tags, mod_type, pathname, target in mod_list:
+                path_mods.setdefault(modulepath, []).append(
+                    Module(
+                        name,
+                        symbols,
+                        modulepath,
+                        tags=tags,
+                        module_type=mod_type,
+                        pathname=pathname,
+                        target=target,
+                    )
+                )
+            # checking stamps of modulefiles is left to fetch_whatis, to report
+            # cached modules quickly
+            self.whatis_fetched = False
+            self.whatis_restore_pending = True
+            self.avail_mods = get_first_mods(path_mods)
+            self.avail_path_mods = path_mods
             self.avail_fetched = True
+            return True
+
+    def fetch_whatis(self, modulepath=None):
+        """Fetch whatis message of available modules with a single module command
+        run and record it in their Module object
+
+        If available modules come from avail cache, whatis messages are first
+        restored from metadata store and module command is only run if some are
+        missing.
+
+        Args:
+            modulepath: only fetch whatis of modules from this modulepath
+
+        Returns:
+            Hash table of whatis message per module name
+        """
+        # module command runs without holding lock, not to delay avail queries
+        with self.state_lock:
+            avail_mods = self.avail_mods
+            if modulepath is None and self.whatis_restore_pending:
+                self.whatis_restore_pending = False
+                if self.carry_whatis(avail_mods):
+                    self.whatis_fetched = True
+                    return {name: mod.whatis for name, mod in avail_mods.items()}
+            if modulepath is None:
+                mod_list = list(avail_mods.values())
+            else:
+                mod_list = [
+                    mod for mod in avail_mods.values() if mod.modulepath == modulepath
+                ]
+            # stamps are taken before running module command, as modulefiles may
+            # change meanwhile
+            stamps = [mod.get_stamp() for mod in mod_list]
+
+        if modulepath is None:
+            whatis_out = self.run("whatis")
+        else:
+            whatis_out = self.run("whatis", env=dict(os.environ, MODULEPATH=modulepath))
+        whatis_dict = parse_whatis(whatis_out)
+        fetched = []
+        for mod, stamp in zip(mod_list, stamps):
+            # modules not reported by whatis get an empty message
+            whatis = ""
+            if mod.name in whatis_dict:
+                whatis = whatis_dict[mod.name] or mod.name
+            fetched.append((mod.name, stamp, whatis))
+        self.metadata_store.put("whatis", fetched)
+
+        with self.state_lock:
+            # available modules may have been fetched again meanwhile
+            if avail_mods is not self.avail_mods:
+                return whatis_dict
+            for mod, (_, stamp, whatis) in zip(mod_list, fetched):
+                if whatis:
+                    mod.whatis = whatis
+                # record modulefile state whatis corresponds to
+                mod.whatis_stamp = stamp
+            if modulepath is None:
+                self.whatis_fetched = True
+            return whatis_dict
+
+    def fetch_avail_paths(self, modulepaths: list[str], progress=None, split=True):
+        """Run one module command per modulepath concurrently to get available
+        modules, so fetch lasts as long as the slowest modulepath rather than the
+        sum of them
+
+        Results are merged in modulepath order, which keeps the natural sort order
+        of each modulepath. As each modulepath is queried alone, modulepaths
+        should only be split if none defines symbolic versions, aliases or hide
+        directives for modules of another one (see can_split_avail).
+
+        Args:
+            modulepaths: modulepaths to query
+            progress: called regularly with list of modules found so far
+            split: query each modulepath separately, otherwise query all of them
+                with a single module command run
+
+        Returns:
+            Hash table of module list per modulepath, in modulepath order
+        """
+        if split:
+            mods = self.iter_avail_paths(modulepaths)
+        else:
+            mods = self.iter_avail(dict(os.environ, MODULEPATH=":".join(modulepaths)))
+        path_mods = {}
+        # modules shown so far, module found in first modulepath taking precedence
+        avail_mods = {}
+        last_report = time.monotonic()
+        for mod in mods:
+            path_mods.setdefault(mod.modulepath, []).append(mod)
+            if progress is not None:
+                avail_mods.setdefault(mod.name, mod)
+                if time.monotonic() - last_report > 0.1:
+                    progress(list(avail_mods.values()))
+                    last_report = time.monotonic()
+        return path_mods
+
+    def iter_avail_paths(self, modulepaths: list[str]):
+        """Yield available modules of each modulepath in modulepath order, while
+        modulepaths are queried concurrently
+
+        Modules of a modulepath are yielded as soon as module command reports them
+        and previous modulepaths are all reported.
+        """
+        if len(modulepaths) < 2:
+            for modulepath in modulepaths:
+                yield from self.iter_avail(dict(os.environ, MODULEPATH=modulepath))
+            return
+
+        def fetch_path_avail(modulepath, path_queue):
+            try:
+                for mod in self.iter_avail(dict(os.environ, MODULEPATH=modulepath)):
+                    path_queue.put(mod)
+            finally:
+                # end of modulepath results
+                path_queue.put(None)
+
+        queues = [queue.SimpleQueue() for _ in modulepaths]
+        workers = min(self.avail_workers, len(modulepaths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(fetch_path_avail, modulepath, path_queue)
+                for modulepath, path_queue in zip(modulepaths, queues)
+            ]
+            for path_queue in queues:
+                mod = path_queue.get()
+                while mod is not None:
+                    yield mod
+                    mod = path_queue.get()
+            # raise error that occurred when querying a modulepath
+            for future in futures:
+                future.result()
+
+    def iter_avail(self, env=None):
+        """Run module command to get available modules and yield Module objects
+        as soon as command reports them
 
-        return self.avail_mods
+        Args:
+            env: environment to run module command in, to query specific
+                modulepaths
+        """
+        modulepath = None
+        # hidden modules are included to be able to show them on demand
+        for line in self.run_lines("avail", "--json", "--all", env=env):
+            parsed = parse_avail_json_line(line)
+            if parsed is None:
+                continue
+            mod_name, entry = parsed
+            # modulepath line precedes the modules it contains
+            if entry is None:
+                modulepath = mod_name
+                continue
+            mod_type = entry.get("type", "modulefile")
+            if mod_type == "directory":
+                continue
+            tags = [tag for tag in entry.get("tags", []) if tag not in ENVIRONMENT_TAGS]
+            yield Module(
+                mod_name,
+                entry.get("symbols") or None,
+                modulepath,
+                tags=tags,
+                module_type=mod_type,
+                pathname=entry.get("pathname"),
+                target=entry.get("target"),
+            )
 
     def loaded(self):
         """Return list of loaded modules"""
@@ -163,21 +677,57 @@ class Modulecmd:
         """Return list of enabled modulepaths"""
         return get_path_envvar_value_list("MODULEPATH")
 
-    def saved(self, refresh=False):
-        """Return list of saved collections"""
-        if not self.saved_fetched or refresh:
-            lines = self.run("savelist", "--terse").strip().split("\n")
-            # skip result header text
-            self.saved_colls = lines[1:]
-            self.avail_fetched = True
-        return self.saved_colls
+    @staticmethod
+    def get_collection_dir():
+        """Return path of directory where collections are saved"""
+        return os.path.join(os.path.expanduser("~"), ".module")
+
+    def get_saved_state(self):
+        """Return state of the elements saved collections depend on: collection
+        target and modification time of collection directory"""
+        return (
+            os.environ.get("MODULES_COLLECTION_TARGET", ""),
+            get_path_mtime(self.get_collection_dir()),
+        )
+
+    def saved(self, refresh=False, force=False):
+        """Return list of saved collections
+
+        Args:
+            refresh: fetch collections again if collection directory or target
+                changed since last fetch
+            force: fetch collections again even if nothing changed
+        """
+        with self.state_lock:
+            if not self.saved_fetched or refresh or force:
+                saved_state = self.get_saved_state()
+                if not self.saved_fetched or force or saved_state != self.saved_state:
+                    lines = self.run("savelist", "--terse").strip().split("\n")
+                    # skip result header text
+                    self.saved_colls = lines[1:]
+                    self.saved_state = saved_state
+                    self.saved_fetched = True
+            return self.saved_colls
+
+    def get_collection_path(self, collection: str):
+        """Return location of collection file for current collection target"""
+        target = os.environ.get("MODULES_COLLECTION_TARGET")
+        if target:
+            collection += f".{target}"
+        return os.path.join(self.get_collection_dir(), collection)
 
     def saveshow(self, collection: str):
         """Return display message defined for collection"""
-        display_out = self.run("saveshow", collection)
-        # extract display message from module command output
-        display_out_list = display_out.split("\n")[2:-3]
-        display_message = "\n".join(display_out_list)
+        # collection may be saved again with different content
+        collection_path = self.get_collection_path(collection)
+        key = ("saveshow", collection_path, get_path_mtime(collection_path))
+        display_message = self.text_cache.get(key)
+        if display_message is None:
+            display_out = self.run("saveshow", collection)
+            # extract display message from module command output
+            display_out_list = display_out.split("\n")[2:-3]
+            display_message = "\n".join(display_out_list)
+            self.text_cache.put(key, display_message)
         return display_message
 
     def version(self):
@@ -199,51 +749,230 @@ class Modulecmd:
         return "\n  ".join(info)
 
 
-class Module:
+class ModuleChanges:
+    """Pending load and unload of modules, applied with one module command run
+    per kind of change"""
+
+    def __init__(self):
+        self.to_load = []
+        self.to_unload = []
+
+    def __bool__(self):
+        return bool(self.to_load or self.to_unload)
+
+    def toggle(self, module_name: str, selected: bool):
+        """Record selection or deselection of a module. A change undoing a pending
+        one cancels it.
+
+        Args:
+            module_name: name of selected or deselected module
+            selected: True to load module, False to unload it
+        """
+        if selected:
+            cancelled, pending = self.to_unload, self.to_load
+        else:
+            cancelled, pending = self.to_load, self.to_unload
+        if module_name in cancelled:
+            cancelled.remove(module_name)
+        elif module_name not in pending:
+            pending.append(module_name)
+
+    def commands(self):
+        """Return list of module commands applying pending changes. Modules are
+        unloaded first to free the place for those to load"""
+        command_list = []
+        if self.to_unload:
+            command_list.append(["unload"] + self.to_unload)
+        if self.to_load:
+            command_list.append(["load"] + self.to_load)
+        return command_list
+
+    def clear(self):
+        """Forget pending changes"""
+        self.to_load = []
+        self.to_unload = []
+
+
+class Module:  # pylint: disable=too-many-instance-attributes
     """Module file representation
 
+    To keep footprint low on large module catalogues, attributes are stored in
+    slots, strings shared by many modules are interned and rarely set details
+    are stored in a dictionary only allocated when one of them is set.
+
     Args:
         name: module name and version designation
         symbols: list of symbolic versions attached to module
+        modulepath: modulepath directory where module is found
+        tags: list of tags attached to module
+        module_type: kind of module (modulefile, virtual or alias)
+        pathname: location of modulefile
+        target: module targeted by alias
     """
 
-    def __init__(self, name, symbols=None):
+    __slots__ = (
+        "name",
+        "symbols",
+        "modulepath",
+        "tags",
+        "module_type",
+        "whatis",
+        "whatis_stamp",
+        "details",
+    )
+
+    def __init__(
+        self,
+        name,
+        symbols=None,
+        modulepath=None,
+        *,
+        tags=None,
+        module_type="modulefile",
+        pathname=None,
+        target=None,
+    ):  # pylint: disable=too-many-arguments
         super().__init__()
         self.name = name
-        self.symbols = symbols
+        self.symbols = get_shared_tuple(symbols) or None
+        self.modulepath = None if modulepath is None else sys.intern(modulepath)
+        self.tags = get_shared_tuple(tags)
+        self.module_type = sys.intern(module_type)
+        # whatis is fetched for all available modules at once, so it gets a slot
         self.whatis = None
-        self.help_message = None
-        self.display_message = None
+        self.whatis_stamp = None
+        self.details = None
+        self.pathname = pathname
+        self.target = target
+
+    def get_detail(self, key: str):
+        """Return value of rarely set detail or None if not set"""
+        if self.details is None:
+            return None
+        return self.details.get(key)
+
+    def set_detail(self, key: str, value):
+        """Set value of rarely set detail, allocating detail storage if needed"""
+        if value is None:
+            if self.details is not None:
+                self.details.pop(key, None)
+            return
+        if self.details is None:
+            self.details = {}
+        self.details[key] = value
+
+    @property
+    def target(self):
+        """Module targeted by alias"""
+        return self.get_detail("target")
+
+    @target.setter
+    def target(self, value):
+        self.set_detail("target", value)
+
+    def get_default_pathname(self):
+        """Return location of modulefile deduced from its modulepath and name"""
+        if self.modulepath is None or self.module_type != "modulefile":
+            return None
+        return os.path.join(self.modulepath, self.name)
+
+    @property
+    def pathname(self):
+        """Location of modulefile. Only recorded if it cannot be deduced from
+        modulepath and module name"""
+        pathname = self.get_detail("pathname")
+        if pathname is None:
+            pathname = self.get_default_pathname()
+        return pathname
+
+    @pathname.setter
+    def pathname(self, value):
+        if value == self.get_default_pathname():
+            value = None
+        self.set_detail("pathname", value)
 
     def __repr__(self):
         return self.name
 
+    def is_hidden(self):
+        """Tell if module is hidden unless specifically asked"""
+        return "hidden" in self.tags
+
+    def get_stamp(self):
+        """Return location, modification time and size of modulefile, to check
+        if messages fetched for module are still valid, or None if modulefile
+        cannot be located, in which case messages cannot be cached"""
+        pathname = self.pathname
+        if not pathname:
+            return None
+        try:
+            stat = os.stat(pathname)
+        except OSError:
+            return None
+        return (pathname, stat.st_mtime_ns, stat.st_size)
+
+    def get_cache_key(self, kind: str):
+        """Return key of message of given kind in text cache, which changes when
+        modulefile is modified, or None if message cannot be cached"""
+        stamp = self.get_stamp()
+        if stamp is None:
+            return None
+        return (kind, self.name, stamp)
+
     def desc(self, modulecmd: Modulecmd):
         """Return whatis message defined for module"""
-        if self.whatis is None:
-            self.whatis = modulecmd.run("whatis", self.name).split(":")[1].strip()
+        stamp = self.get_stamp()
+        if self.whatis is None or self.whatis_stamp != stamp:
+            self.whatis = None
+            self.whatis_stamp = stamp
+            whatis_dict = parse_whatis(modulecmd.run("whatis", self.name))
+            if self.name in whatis_dict:
+                self.whatis = whatis_dict[self.name]
+            elif whatis_dict:
+                # module may be reported under its fully qualified name
+                self.whatis = next(iter(whatis_dict.values()))
             if not self.whatis:
                 self.whatis = self.name
+            modulecmd.metadata_store.put("whatis", [(self.name, stamp, self.whatis)])
         return self.whatis
 
     def display(self, modulecmd: Modulecmd):
-        """Return display message defined for module"""
-        if self.display_message is None:
+        """Return display message defined for module, cached by module command"""
+        key = self.get_cache_key("display")
+        display_message = None
+        if key is not None:
+            display_message = modulecmd.text_cache.get(key)
+        if display_message is None:
             display_out = modulecmd.run("display", self.name)
             # extract display message from module command output
             display_out_list = display_out.split("\n")[2:-2]
-            self.display_message = "\n".join(display_out_list)
-        return self.display_message
+            display_message = "\n".join(display_out_list)
+            if key is not None:
+                modulecmd.text_cache.put(key, display_message)
+        return display_message
 
     def help(self, modulecmd: Modulecmd):
-        """Return help message defined for module"""
-        if self.help_message is None:
+        """Return help message defined for module, cached by module command and
+        kept in its metadata store across sessions"""
+        key = self.get_cache_key("help")
+        help_message = None
+        if key is not None:
+            help_message = modulecmd.text_cache.get(key)
+        if help_message is None and key is not None:
+            help_message = modulecmd.metadata_store.get("help", self.name, key[2])
+            if help_message is not None:
+                modulecmd.text_cache.put(key, help_message)
+        if help_message is None:
             help_out = modulecmd.run("help", self.name)
             # extract help message from module command output
             help_out = re.sub(r"Module Specific Help for .*:", "", help_out)
             help_out = re.sub(
                 r"WARNING: Unable to find ModulesHelp in .*\.", "", help_out
             )
-            help_out = help_out.strip("-\n ")
-            self.help_message = help_out
-        return self.help_message
+            help_message = help_out.strip("-\n ")
+            if key is not None:
+                modulecmd.text_cache.put(key, help_message)
+                modulecmd.metadata_store.put(
+                    "help", [(self.name, key[2], help_message)]
+                )
+        return help_message
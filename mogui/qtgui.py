@@ -18,42 +18,63 @@
 
 ##########################################################################
 
-import math
+# pylint: disable=too-many-lines
+
 import os
+import time
 from typing import Dict
 
 # Gui PyQt
 from PyQt5.QtCore import (
     QEvent,
-    QItemSelectionModel,
     QSettings,
+    QFileSystemWatcher,
+    QModelIndex,
     QSize,
+    QTimer,
     Qt,
     QPoint,
 )
 
 from PyQt5.QtGui import (
     QIcon,
-    QStandardItem,
-    QStandardItemModel,
+    QKeySequence,
 )
 
 from PyQt5.QtWidgets import (
-    QAbstractItemView,
     QAction,
+    QApplication,
+    QCheckBox,
     QFrame,
-    QHeaderView,
+    QHBoxLayout,
     QLabel,
-    QListView,
+    QLineEdit,
     QMainWindow,
-    QTableView,
+    QProgressBar,
+    QPushButton,
+    QShortcut,
+    QStackedWidget,
     QTabWidget,
     QVBoxLayout,
     QWhatsThis,
 )
 
-from mogui.modules import Modulecmd, Module
-from mogui.utils import print_debug
+from mogui.modules import (
+    Modulecmd,
+    Module,
+    ModuleChanges,
+    get_path_envvar_value_list,
+)
+from mogui.qtrunner import ModulecmdRunner
+from mogui.qtviews import (
+    AvailModulesTreeView,
+    AvailModulesView,
+    LoadedModulesView,
+    StringsView,
+)
+from mogui.search import ModuleIndex, TextIndex
+from mogui.shell import get_shell_code
+from mogui.utils import print_debug, print_error
 
 
 class MoGui(
@@ -61,12 +82,58 @@ class MoGui(
 ):  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """MoGui's application main window"""
 
-    def __init__(self, modulecmd: Modulecmd, shell_out=None, debug=False):
+    def __init__(
+        self,
+        modulecmd: Modulecmd,
+        shell_out=None,
+        debug=False,
+        single_run=False,
+        coalesce=False,
+        *,
+        start_time=None,
+    ):  # pylint: disable=too-many-arguments
         super().__init__()
+        # startup duration is measured from given time in debug mode
+        self.start_time = time.perf_counter() if start_time is None else start_time
         self.modulecmd = modulecmd
         self.shell_out = shell_out
+        self.shell_code = get_shell_code(shell_out) if shell_out else None
         self.debug = debug
+        self.single_run = single_run
+        # record initial environment to produce net environment change on exit
+        if coalesce and shell_out:
+            self.initial_env = dict(os.environ)
+            self.initial_cwd = os.getcwd()
+        else:
+            self.initial_env = None
         self.buttons: Dict[str, QAction] = {}
+        self.runner = ModulecmdRunner(self)
+        self.avail_dict = {}
+        self.avail_index = None
+        # index of module messages, built when search mode is enabled
+        self.text_index = None
+        self.text_indexed_dict = None
+        self.text_indexing = False
+        self.loaded_list = []
+        self.used_list = []
+        self.saved_list = None
+        self.module_changes = ModuleChanges()
+        # changes submitted to module command but not yet evaluated
+        self.inflight_changes = []
+        # delay applying clicks on modules to gather those quickly following
+        self.apply_timer = QTimer(self)
+        self.apply_timer.setSingleShot(True)
+        self.apply_timer.setInterval(400)
+        self.apply_timer.timeout.connect(self.apply_changes)
+        # watch modulepaths and collections to refresh widgets when they change.
+        # Bursts of changes are gathered before refreshing
+        self.changed_modulepaths = set()
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(1000)
+        self.watch_timer.timeout.connect(self.refresh_watched_changes)
 
         icon_theme_path = os.path.abspath(
             os.path.join(os.path.dirname(__file__), "icons")
@@ -78,7 +145,18 @@ class MoGui(
         self.setWindowIcon(QIcon.fromTheme("environment-modules"))
 
         self.create_objects()
-        self.refresh_widgets()
+        # window is shown before module state is fetched. Views are filled as
+        # their data arrives
+        self.set_tab_loading(self.avail_frame, True)
+        self.set_tab_loading(self.saved_collections, True)
+        self.show_environment()
+        self.runner.submit(
+            "refresh",
+            self.fetch_initial_state,
+            callback=self.on_initial_state_fetched,
+            errback=self.report_error,
+            progressback=self.show_initial_progress,
+        )
         self.readSettings()
 
     def create_button(self, text: str, icon: str, shortcut: str, call):
@@ -89,7 +167,7 @@ class MoGui(
         self.buttons[text].triggered.connect(call)
         self.toolbar.addAction(self.buttons[text])
 
-    def create_objects(self):
+    def create_objects(self):  # pylint: disable=too-many-statements
         """Initialize GUI objects"""
         # Set ToolBar
         self.toolbar = self.addToolBar("&Toolbar")
@@ -108,8 +186,13 @@ class MoGui(
         self.create_button("Help", "help-contents-symbolic", "F1", self.help)
         self.create_button("Quit", "application-exit-symbolic", "Ctrl+Q", self.close)
 
-        # Status bar
-        self.statusBar()
+        # Status bar, with a busy indicator shown while module commands run
+        self.busy_indicator = QProgressBar(self)
+        self.busy_indicator.setRange(0, 0)
+        self.busy_indicator.setMaximumWidth(120)
+        self.busy_indicator.setVisible(False)
+        self.statusBar().addPermanentWidget(self.busy_indicator)
+        self.runner.busy.connect(self.busy_indicator.setVisible)
 
         # Main frame
         self.main_frame = QFrame(self)
@@ -117,15 +200,83 @@ class MoGui(
 
         # Module/modulepath/collection widgets
         self.avail_modules = AvailModulesView(self.load, self.unload, self.show_help)
+        self.avail_tree = AvailModulesTreeView(self.load, self.unload, self.show_help)
+        # view currently showing available modules
+        self.avail_view = self.avail_modules
+        # prefetch help of modules under mouse cursor
+        for view in (self.avail_modules, self.avail_tree):
+            view.setMouseTracking(True)
+            view.entered.connect(self.on_avail_item_hovered)
         self.used_modulepaths = StringsView(self.unuse)
         self.saved_collections = StringsView(self.restore, self.show_saveshow)
         self.loaded_modules = LoadedModulesView(self.unload, self.show_display)
 
+        # Filter box above available modules
+        self.avail_filter = QLineEdit(self)
+        self.avail_filter.setPlaceholderText("Filter available modules (Ctrl+F)")
+        self.avail_filter.setClearButtonEnabled(True)
+        self.avail_filter.textChanged.connect(self.refresh_avail_modules)
+        self.filter_shortcut = QShortcut(QKeySequence("Ctrl+F"), self)
+        self.filter_shortcut.activated.connect(self.focus_avail_filter)
+        self.avail_frame = QFrame(self)
+
+        # Hidden modules are reported by module command but only shown on demand
+        self.hidden_checkbox = QCheckBox("Show hidden", self)
+        self.hidden_checkbox.setShortcut("Ctrl+H")
+        self.hidden_checkbox.setToolTip("Show hidden modules (Ctrl+H)")
+        self.hidden_checkbox.toggled.connect(self.refresh_avail_modules)
+
+        # Filter text may also be searched in whatis and help messages of modules
+        self.search_checkbox = QCheckBox("Search help", self)
+        self.search_checkbox.setShortcut("Ctrl+E")
+        self.search_checkbox.setToolTip(
+            "Also list modules whose whatis or help message matches filter text,"
+            " and highlight them (Ctrl+E)"
+        )
+        self.search_checkbox.toggled.connect(self.toggle_search_mode)
+
+        # Available modules are listed in a table or grouped by name in a tree
+        self.avail_stack = QStackedWidget(self)
+        self.avail_stack.addWidget(self.avail_modules)
+        self.avail_stack.addWidget(self.avail_tree)
+        self.tree_checkbox = QCheckBox("Tree view", self)
+        self.tree_checkbox.setShortcut("Ctrl+T")
+        self.tree_checkbox.setToolTip("Group available modules by name (Ctrl+T)")
+        self.tree_checkbox.toggled.connect(self.toggle_tree_view)
+
+        # Staging mode controls: clicks only mark modules until changes are applied
+        self.stage_checkbox = QCheckBox("Stage changes", self)
+        self.stage_checkbox.setToolTip(
+            "Mark modules to load or unload, then apply all changes at once"
+        )
+        self.stage_checkbox.toggled.connect(self.toggle_staging)
+        self.apply_button = QPushButton("Apply", self)
+        self.apply_button.setShortcut("Ctrl+Return")
+        self.apply_button.setToolTip("Apply staged changes (Ctrl+Return)")
+        self.apply_button.setEnabled(False)
+        self.apply_button.clicked.connect(self.apply_changes)
+
+        self.avail_controls = QHBoxLayout()
+        self.avail_controls.addWidget(self.avail_filter)
+        self.avail_controls.addWidget(self.search_checkbox)
+        self.avail_controls.addWidget(self.hidden_checkbox)
+        self.avail_controls.addWidget(self.tree_checkbox)
+        self.avail_controls.addWidget(self.stage_checkbox)
+        self.avail_controls.addWidget(self.apply_button)
+        self.avail_layout = QVBoxLayout(self.avail_frame)
+        self.avail_layout.setContentsMargins(0, 0, 0, 0)
+        self.avail_layout.addLayout(self.avail_controls)
+        self.avail_layout.addWidget(self.avail_stack)
+
         # Tab
         self.tab = QTabWidget(self)
-        self.tab.addTab(self.avail_modules, "Available modules")
-        self.tab.addTab(self.used_modulepaths, "Used modulepaths")
-        self.tab.addTab(self.saved_collections, "Saved collections")
+        self.tab_labels = {
+            self.avail_frame: "Available modules",
+            self.used_modulepaths: "Used modulepaths",
+            self.saved_collections: "Saved collections",
+        }
+        for widget, label in self.tab_labels.items():
+            self.tab.addTab(widget, label)
 
         # Main layout
         self.layout = QVBoxLayout(self.main_frame)
@@ -148,29 +299,428 @@ class MoGui(
         if event.type() == QEvent.PaletteChange:
             self.set_icon_theme_based_on_palette()
 
-    def refresh_widgets(self):
-        """Fetch current module state and refresh widgets"""
-        avail_dict = self.modulecmd.avail(refresh=True)
+    def set_tab_loading(self, widget, loading: bool):
+        """Tell in tab title if content of widget is still being fetched"""
+        label = self.tab_labels[widget]
+        if loading:
+            label += " (loading...)"
+        self.tab.setTabText(self.tab.indexOf(widget), label)
+
+    def report_startup_time(self, step: str):
+        """Report in debug mode time elapsed since application started"""
+        if self.debug:
+            elapsed = time.perf_counter() - self.start_time
+            print_debug(f"Startup: {step} after {elapsed:.3f}s")
+
+    def check_modulecmd(self):
+        """Check in background that module command is at required version. Exit
+        application if it is not"""
+        self.runner.submit(
+            "version",
+            self.modulecmd.check_version,
+            callback=self.on_modulecmd_checked,
+            errback=self.on_modulecmd_check_failed,
+        )
+
+    def on_modulecmd_checked(self, version: str):  # pylint: disable=unused-argument
+        """Report module command once its version is checked"""
+        self.report_startup_time("module command checked")
+        if self.debug:
+            print_debug(self.modulecmd)
+
+    def on_modulecmd_check_failed(self, error: Exception):
+        """Report unsuitable module command and exit application, once background
+        tasks started meanwhile are stopped"""
+        print_error(error)
+        self.runner.shutdown()
+        QApplication.exit(1)
+
+    def show_environment(self):
+        """Fill loaded modules and used modulepaths widgets from environment, as
+        their content is known before any module command runs"""
+        self.used_list = self.modulecmd.used()
+        self.used_modulepaths.refresh(self.used_list)
+        self.update_watched_dirs()
+        self.loaded_list = self.get_module_list(self.modulecmd.loaded(), {})
+        self.refresh_loaded_modules()
+
+    def fetch_initial_state(self, progress):
+        """Report available modules recorded in cache, then fetch current module
+        state to validate them (run in worker thread)"""
+        if self.modulecmd.load_avail_cache():
+            progress(self.modulecmd.avail())
+            # cached modules are shown until all modulepaths are queried
+            progress = None
+        return self.fetch_state(True, (), progress)
+
+    def show_initial_progress(self, value):
+        """Show available modules recorded in cache or those found so far"""
+        # table of all modules comes from cache, list from modules being fetched
+        if isinstance(value, dict):
+            self.update_widgets((value, None))
+            self.set_tab_loading(self.avail_frame, False)
+            self.report_startup_time("cached available modules shown")
+        else:
+            self.show_avail_progress(value)
+
+    def on_initial_state_fetched(self, state):
+        """Refresh widgets with module state fetched at startup"""
+        self.update_widgets(state)
+        self.report_startup_time("module state fetched")
+
+    def refresh_widgets(self, force=False):
+        """Fetch current module state in background then refresh widgets
+
+        Args:
+            force: fetch available modules and saved collections even if
+                modulepaths and collection directory did not change
+        """
+        # modulepaths seen changing are kept until a refresh completes
+        modulepaths = frozenset(self.changed_modulepaths)
+        # show available modules as they are found unless a list is already shown
+        # which forced fetch will update
+        if force and self.avail_dict:
+            progressback = None
+        else:
+            progressback = self.show_avail_progress
+        self.runner.submit(
+            "refresh",
+            self.fetch_state,
+            force,
+            modulepaths,
+            callback=lambda state: self.update_widgets(state, modulepaths),
+            errback=self.report_error,
+            progressback=progressback,
+        )
+
+    def fetch_state(self, force=False, modulepaths=(), progress=None):
+        """Fetch available modules and saved collections (run in worker thread).
+        Module command is only run if modulepaths or collection directory changed
+        since last fetch"""
+        avail_dict = self.modulecmd.avail(
+            refresh=True, force=force, modulepaths=modulepaths, progress=progress
+        )
+        saved_list = self.modulecmd.saved(refresh=True, force=force)
+        return avail_dict, saved_list
+
+    def update_widgets(self, state, refreshed_modulepaths=()):
+        """Refresh widgets whose content changed in fetched module state. Saved
+        collections widget is not refreshed if state does not provide them"""
+        avail_dict, saved_list = state
+        self.changed_modulepaths.difference_update(refreshed_modulepaths)
+        self.set_tab_loading(self.avail_frame, False)
+        if saved_list is not None:
+            self.set_tab_loading(self.saved_collections, False)
         used_list = self.modulecmd.used()
-        saved_list = self.modulecmd.saved()
+        loaded_names = self.modulecmd.loaded()
+        avail_changed = avail_dict is not self.avail_dict
+        loaded_changed = loaded_names != [mod.name for mod in self.loaded_list]
+
+        # modules not yet found among available ones are replaced once they are
+        if avail_changed or loaded_changed:
+            self.loaded_list = self.get_module_list(loaded_names, avail_dict)
+            self.prefetch_info("display", self.loaded_list)
+
+        # Index available modules for filtering once they are fetched. Previous
+        # index keeps filtering meanwhile
+        if avail_changed:
+            self.avail_dict = avail_dict
+            self.runner.submit(
+                "index",
+                ModuleIndex,
+                list(avail_dict.values()),
+                callback=self.set_avail_index,
+                errback=self.report_error,
+            )
+            if self.search_checkbox.isChecked():
+                self.build_text_index()
+
+        # Refresh widgets
+        if used_list != self.used_list:
+            self.used_list = used_list
+            self.used_modulepaths.refresh(used_list)
+            self.update_watched_dirs()
+        if saved_list is not None and saved_list != self.saved_list:
+            self.saved_list = saved_list
+            self.saved_collections.refresh(saved_list)
+            self.update_watched_dirs()
+        if avail_changed or loaded_changed:
+            self.refresh_avail_modules()
+            self.refresh_loaded_modules()
+
+        # Get descriptions of all available modules at once to show them as tooltips
+        if not self.modulecmd.whatis_fetched:
+            self.runner.submit(
+                "whatis",
+                self.modulecmd.fetch_whatis,
+                callback=lambda whatis_dict: self.avail_view.viewport().update(),
+                errback=self.report_error,
+            )
+
+    def prefetch_info(self, kind: str, module_list: list[Module]):
+        """Fetch in background help or display message of modules, to have them
+        cached when asked
+
+        Args:
+            kind: 'help' or 'display'
+            module_list: modules whose message is fetched
+        """
+        self.runner.submit(
+            f"prefetch-{kind}",
+            self.fetch_info,
+            kind,
+            module_list,
+            errback=self.report_prefetch_error,
+            quiet=True,
+        )
+
+    def fetch_info(self, kind: str, module_list: list[Module]):
+        """Fetch help or display message of modules not yet cached (run in worker
+        thread). Messages that cannot be cached are not fetched"""
+        for module in module_list:
+            key = module.get_cache_key(kind)
+            if key is not None and key not in self.modulecmd.text_cache:
+                getattr(module, kind)(self.modulecmd)
 
-        loaded_list = []
-        for loaded_mod in self.modulecmd.loaded():
+    def report_prefetch_error(self, error: Exception):
+        """Report error of message prefetch in debug mode only, as message is
+        fetched again when asked"""
+        if self.debug:
+            print_error(error)
+
+    def on_avail_item_hovered(self, index: QModelIndex):
+        """Prefetch help of module under mouse cursor and of its neighbors"""
+        module_list = []
+        for offset in (0, 1, -1):
+            module = self.avail_view.get_module_from_index(
+                index.sibling(index.row() + offset, index.column())
+            )
+            if module is not None:
+                module_list.append(module)
+        if module_list:
+            self.prefetch_info("help", module_list)
+
+    def show_avail_progress(self, module_list: list[Module]):
+        """Show available modules found so far, while they are still fetched"""
+        if not self.avail_filter.text():
+            self.avail_view.refresh(self.filter_hidden(module_list))
+            self.avail_view.select(self.get_expected_loaded_list())
+
+    def update_watched_dirs(self):
+        """Watch enabled modulepaths, their module directories and collection
+        directory, which are listed in background"""
+        self.runner.submit(
+            "watch",
+            self.get_watched_dirs,
+            list(self.used_list),
+            callback=self.set_watched_dirs,
+            errback=self.report_error,
+        )
+
+    def get_watched_dirs(self, modulepaths: list[str]):
+        """Return set of directories to watch (run in worker thread)"""
+        watched_dirs = set()
+        for modulepath in modulepaths:
+            watched_dirs.add(modulepath)
+            try:
+                with os.scandir(modulepath) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and not entry.name.startswith("."):
+                            watched_dirs.add(entry.path)
+            except OSError:
+                pass
+        collection_dir = self.modulecmd.get_collection_dir()
+        if os.path.isdir(collection_dir):
+            watched_dirs.add(collection_dir)
+        return watched_dirs
+
+    def set_watched_dirs(self, watched_dirs: set[str]):
+        """Watch given directories and stop watching the others"""
+        current_dirs = set(self.fs_watcher.directories())
+        outdated_dirs = current_dirs - watched_dirs
+        if outdated_dirs:
+            self.fs_watcher.removePaths(list(outdated_dirs))
+        new_dirs = watched_dirs - current_dirs
+        if new_dirs:
+            self.fs_watcher.addPaths(list(new_dirs))
+
+    def on_directory_changed(self, path: str):
+        """Record modulepath whose content changed and wait for other changes
+        before refreshing widgets"""
+        if path in self.used_list:
+            self.changed_modulepaths.add(path)
+        elif os.path.dirname(path) in self.used_list:
+            self.changed_modulepaths.add(os.path.dirname(path))
+        self.watch_timer.start()
+
+    def refresh_watched_changes(self):
+        """Refresh widgets after changes in watched directories"""
+        self.report_event("Modulepath or collection directory changed")
+        # watch module directories created meanwhile
+        self.update_watched_dirs()
+        self.refresh_widgets()
+
+    @staticmethod
+    def get_module_list(module_names: list[str], avail_dict: dict):
+        """Return Module objects of available modules matching given names"""
+        module_list = []
+        for name in module_names:
             # loaded module may not be part of available modules
-            if loaded_mod in avail_dict:
-                mod = avail_dict[loaded_mod]
+            if name in avail_dict:
+                mod = avail_dict[name]
             else:
-                mod = Module(loaded_mod)
-            loaded_list.append(mod)
+                mod = Module(name)
+            module_list.append(mod)
+        return module_list
+
+    def get_pending_changes(self):
+        """Return changes being evaluated followed by changes waiting to be
+        applied"""
+        return self.inflight_changes + [self.module_changes]
+
+    def get_expected_loaded_list(self):
+        """Return modules expected to be loaded once pending changes are
+        evaluated"""
+        loaded_names = [mod.name for mod in self.loaded_list]
+        for changes in self.get_pending_changes():
+            loaded_names = [
+                name for name in loaded_names if name not in changes.to_unload
+            ]
+            loaded_names += [
+                name for name in changes.to_load if name not in loaded_names
+            ]
+        return self.get_module_list(loaded_names, self.avail_dict)
+
+    def refresh_loaded_modules(self):
+        """Refresh loaded modules widget with modules expected to be loaded, those
+        with a pending change being marked"""
+        self.loaded_modules.refresh(self.get_expected_loaded_list())
+
+    def set_avail_index(self, avail_index: ModuleIndex):
+        """Record search index of available modules and apply filter with it"""
+        self.avail_index = avail_index
+        if self.avail_filter.text():
+            self.refresh_avail_modules()
+
+    def refresh_avail_modules(self):
+        """Refresh available modules widget with modules matching filter text, then
+        select loaded modules in it. In search mode, modules whose messages match
+        filter text are also listed and highlighted"""
+        text = self.avail_filter.text()
+        matched_names = set()
+        if text and self.avail_index is not None:
+            # index may have been built from previously fetched modules
+            module_list = [
+                self.avail_dict[mod.name]
+                for mod in self.avail_index.search(text)
+                if mod.name in self.avail_dict
+            ]
+            if self.search_checkbox.isChecked() and self.text_index is not None:
+                matched_names = self.text_index.search(text)
+                listed_names = {mod.name for mod in module_list} | matched_names
+                module_list = [
+                    mod for mod in self.avail_dict.values() if mod.name in listed_names
+                ]
+        else:
+            # filter is applied once search index is built
+            module_list = list(self.avail_dict.values())
+        self.avail_view.refresh(self.filter_hidden(module_list))
+        self.avail_view.mark_matched(matched_names)
+
+        # Select loaded modules in the available modules list, pending changes
+        # included
+        self.avail_view.select(self.get_expected_loaded_list())
+
+    def toggle_search_mode(self, checked: bool):
+        """Enable or disable search of filter text in module messages, building
+        their index if needed"""
+        if checked:
+            self.build_text_index()
+        self.refresh_avail_modules()
+
+    def build_text_index(self):
+        """Index messages of available modules in background, unless an index is
+        being built or is up to date"""
+        if self.text_indexing or self.text_indexed_dict is self.avail_dict:
+            return
+        avail_dict = self.avail_dict
+        self.text_indexing = True
+        self.runner.submit(
+            "text-index",
+            self.fetch_text_index,
+            self.text_index,
+            list(avail_dict.values()),
+            callback=lambda text_index: self.set_text_index(text_index, avail_dict),
+            errback=self.on_text_index_failed,
+            progressback=self.show_text_index_progress,
+        )
 
-        # Refresh widgets
-        self.used_modulepaths.refresh(used_list)
-        self.saved_collections.refresh(saved_list)
-        self.avail_modules.refresh(list(avail_dict.values()))
-        self.loaded_modules.refresh(loaded_list)
+    def fetch_text_index(self, text_index, module_list: list[Module], progress=None):
+        """Update index of module messages with given modules, starting from
+        previous index or from the one recorded in cache (run in worker thread).
+        Indexing stops when application quits, modules indexed so far are saved
+        so indexing resumes on next session"""
+        if not self.modulecmd.whatis_fetched:
+            self.modulecmd.fetch_whatis()
+        entries = None if text_index is None else dict(text_index.entries)
+        text_index = TextIndex(entries)
+        text_index.update(
+            module_list,
+            self.modulecmd,
+            progress,
+            cancelled=lambda: self.runner.stopping,
+        )
+        text_index.save()
+        return text_index
+
+    def set_text_index(self, text_index: TextIndex, avail_dict: dict):
+        """Record index of module messages and apply search with it. Index is
+        built again if available modules changed meanwhile"""
+        self.text_indexing = False
+        self.text_index = text_index
+        self.text_indexed_dict = avail_dict
+        self.statusBar().clearMessage()
+        if self.search_checkbox.isChecked():
+            self.build_text_index()
+            if self.avail_filter.text():
+                self.refresh_avail_modules()
+
+    def on_text_index_failed(self, error: Exception):
+        """Report error of module messages indexing"""
+        self.text_indexing = False
+        self.statusBar().clearMessage()
+        self.report_error(error)
+
+    def show_text_index_progress(self, count: int):
+        """Report number of modules whose messages are left to index"""
+        self.statusBar().showMessage(f"Indexing module messages, {count} left")
+
+    def toggle_tree_view(self, checked: bool):
+        """Show available modules in tree or in table"""
+        if checked:
+            self.avail_view = self.avail_tree
+        else:
+            self.avail_view = self.avail_modules
+        self.avail_stack.setCurrentWidget(self.avail_view)
+        # only the shown view is kept up to date
+        self.refresh_avail_modules()
+
+    def filter_hidden(self, module_list: list[Module]):
+        """Remove hidden modules from list unless they are asked or loaded"""
+        if self.hidden_checkbox.isChecked():
+            return module_list
+        loaded_names = {mod.name for mod in self.get_expected_loaded_list()}
+        return [
+            mod
+            for mod in module_list
+            if not mod.is_hidden() or mod.name in loaded_names
+        ]
 
-        # Select loaded modules in the available modules list
-        self.avail_modules.select(loaded_list)
+    def focus_avail_filter(self):
+        """Show available modules tab and give focus to its filter box"""
+        self.tab.setCurrentWidget(self.avail_frame)
+        self.avail_filter.setFocus()
+        self.avail_filter.selectAll()
 
     def report_event(self, message, sub=False):
         """Report an event message"""
@@ -186,6 +736,11 @@ class MoGui(
         if self.debug:
             print_debug(text)
 
+    def report_error(self, error: Exception):
+        """Report error raised by a module command request"""
+        self.statusBar().showMessage(f"Error: {error}")
+        print_error(error)
+
     def modulecmd_print_out(self, *arguments):
         """Print on stdout environment change code produced by module command for
         configured out shell
@@ -203,17 +758,175 @@ class MoGui(
             if content:
                 print(content)
 
+    def modulecmd_eval_print_out(self, *arguments):
+        """Evaluate module command, then print on stdout code for configured out
+        shell reproducing the environment change it made
+
+        Args:
+            arguments: list of module command and its arguments
+
+        Returns:
+            Boolean status of module command evaluation
+        """
+        env_before = dict(os.environ)
+        cwd_before = os.getcwd()
+        status = self.modulecmd.eval(*arguments)
+
+        content = self.shell_code.env_change(env_before, dict(os.environ))
+        if os.getcwd() != cwd_before:
+            content += "\n" + self.shell_code.chdir(os.getcwd())
+        if content:
+            print(content)
+
+        # define shell aliases, functions and completions of loaded modules, as they
+        # are not part of environment change
+        if os.environ.get("__MODULES_LMREFRESH"):
+            self.modulecmd_print_out("refresh")
+        return status
+
+    def print_out_net_env_change(self):
+        """Print on stdout code for configured out shell applying the net
+        environment change made since application start"""
+        initial_env = self.initial_env
+        self.initial_env = None
+
+        # unset shell aliases, functions and completions of the modules loaded
+        # initially that are now unloaded
+        initial_refresh = get_path_envvar_value_list(
+            "__MODULES_LMREFRESH", env=initial_env
+        )
+        current_refresh = get_path_envvar_value_list("__MODULES_LMREFRESH")
+        unloaded_refresh = [
+            mod for mod in initial_refresh if mod not in current_refresh
+        ]
+        if unloaded_refresh:
+            content = self.modulecmd.run(
+                "unload",
+                *unloaded_refresh,
+                out_shell=self.shell_out,
+                return_content="out",
+                silent_err=True,
+                env=initial_env,
+            )
+            if content:
+                print(content)
+            initial_env = self.modulecmd.eval_env(
+                "unload", *unloaded_refresh, env=initial_env
+            )
+
+        content = self.shell_code.env_change(initial_env, dict(os.environ))
+        if os.getcwd() != self.initial_cwd:
+            content += "\n" + self.shell_code.chdir(os.getcwd())
+        if content:
+            print(content)
+
+        # define shell aliases, functions and completions of newly loaded modules
+        if [mod for mod in current_refresh if mod not in initial_refresh]:
+            self.modulecmd_print_out("refresh")
+
     def modulecmd_eval(self, *arguments):
-        """Evaluate module command, refresh widgets and report module changes
+        """Evaluate module command in background, then refresh widgets and report
+        module changes
 
         Args:
             arguments: list of module command and its arguments
         """
+        self.modulecmd_eval_commands([arguments])
+
+    def modulecmd_eval_commands(self, command_list, changes=None):
+        """Evaluate module commands one after the other in background, then refresh
+        widgets once and report module changes
+
+        Args:
+            command_list: list of module commands with their arguments
+            changes: module changes that commands apply, shown as pending until
+                they are evaluated
+        """
+        if changes is not None:
+            self.inflight_changes.append(changes)
+        self.runner.submit(
+            None,
+            self.modulecmd_run_eval,
+            command_list,
+            callback=lambda result: self.report_module_changes(result, changes),
+            errback=lambda error: self.on_modulecmd_eval_failed(error, changes),
+            serial=True,
+        )
+
+    def modulecmd_run_eval(self, command_list):
+        """Update parent shell and current environments with module commands (run
+        in worker thread)
+
+        Args:
+            command_list: list of module commands with their arguments
+
+        Returns:
+            List of modules loaded before and after evaluation, and evaluation
+            status of all commands
+        """
         loaded_before = self.modulecmd.loaded()
-        self.modulecmd_print_out(*arguments)
-        self.modulecmd.eval(*arguments)
+        status = True
+        for arguments in command_list:
+            if not self.modulecmd_update_env(*arguments):
+                status = False
         loaded_after = self.modulecmd.loaded()
+        return loaded_before, loaded_after, status
+
+    def modulecmd_update_env(self, *arguments):
+        """Update parent shell and current environments with module command
+
+        Args:
+            arguments: list of module command and its arguments
 
+        Returns:
+            Boolean status of module command evaluation
+        """
+        # environment change is applied to parent shell on exit in coalesce mode
+        if self.initial_env is not None:
+            status = self.modulecmd.eval(*arguments)
+        # run module command once if no loaded module defines shell aliases,
+        # functions or completions, which may have to be unset by command
+        elif (
+            self.single_run
+            and self.shell_out
+            and not os.environ.get("__MODULES_LMREFRESH")
+        ):
+            status = self.modulecmd_eval_print_out(*arguments)
+        else:
+            self.modulecmd_print_out(*arguments)
+            status = self.modulecmd.eval(*arguments)
+        return status
+
+    def on_modulecmd_eval_failed(self, error: Exception, changes=None):
+        """Report module command evaluation error, drop changes it was applying and
+        refresh widgets"""
+        self.report_error(error)
+        if changes is not None:
+            self.inflight_changes.remove(changes)
+            self.mark_staged_changes()
+            self.refresh_loaded_modules()
+            self.refresh_avail_modules()
+        self.refresh_widgets()
+
+    def report_module_changes(self, result, changes=None):
+        """Reconcile widgets with modules actually loaded, report module changes
+        then refresh widgets
+
+        Args:
+            result: modules loaded before and after evaluation, and its status
+            changes: module changes that evaluation applied
+        """
+        loaded_before, loaded_after, status = result
+        if changes is not None:
+            self.inflight_changes.remove(changes)
+            self.mark_staged_changes()
+            # show loaded modules right away, without waiting for refresh
+            self.loaded_list = self.get_module_list(loaded_after, self.avail_dict)
+            self.prefetch_info("display", self.loaded_list)
+            self.refresh_loaded_modules()
+            self.refresh_avail_modules()
+            if not status:
+                self.report_rolled_back_changes(changes, loaded_after)
         self.refresh_widgets()
 
         # report module changes
@@ -225,45 +938,118 @@ class MoGui(
             if module not in loaded_before:
                 self.report_event(f"'{module}' loaded", True)
 
+    def report_rolled_back_changes(self, changes: ModuleChanges, loaded: list[str]):
+        """Report in status bar pending changes that failed to apply"""
+        failed = [name for name in changes.to_load if name not in loaded]
+        failed += [name for name in changes.to_unload if name in loaded]
+        if failed:
+            names = ", ".join(f"'{name}'" for name in failed)
+            self.statusBar().showMessage(f"Failed to change {names}, rolled back")
+        else:
+            self.statusBar().showMessage("Module command reported an error")
+
     def load(self, module: Module):
-        """Load specified module"""
-        self.report_event(f"Module '{module}' selected")
-        self.modulecmd_eval("load", str(module))
+        """Load specified module, or stage its load in staging mode"""
+        if self.stage_checkbox.isChecked():
+            self.report_event(f"Module '{module}' staged for load")
+        else:
+            self.report_event(f"Module '{module}' selected")
+        self.stage_change(module, True)
 
     def unload(self, module: Module):
-        """Unload specified module"""
-        self.report_event(f"Module '{module}' deselected")
-        self.modulecmd_eval("unload", str(module))
-
-    def show_display(self, position: QPoint, module: Module):
-        """Report display info of selected module in WhatsThis window"""
-        display_message = module.display(self.modulecmd)
-        if len(display_message):
+        """Unload specified module, or stage its unload in staging mode"""
+        if self.stage_checkbox.isChecked():
+            self.report_event(f"Module '{module}' staged for unload")
+        else:
+            self.report_event(f"Module '{module}' deselected")
+        self.stage_change(module, False)
+
+    def stage_change(self, module: Module, selected: bool):
+        """Record module selection change in pending changes and mark them. Out of
+        staging mode, changes are applied once no other click happens for a short
+        time, to send a single module command for quick successive clicks"""
+        self.module_changes.toggle(module.name, selected)
+        self.mark_staged_changes()
+        self.refresh_loaded_modules()
+        # module may be deselected from loaded modules widget
+        if not selected:
+            self.refresh_avail_modules()
+        if not self.stage_checkbox.isChecked():
+            self.apply_timer.start()
+
+    def mark_staged_changes(self):
+        """Mark modules with pending changes and enable Apply button if any"""
+        pending_names = []
+        for changes in self.get_pending_changes():
+            pending_names += changes.to_load + changes.to_unload
+        self.avail_modules.mark_pending(pending_names)
+        self.avail_tree.mark_pending(pending_names)
+        self.loaded_modules.mark_pending(pending_names)
+        self.apply_button.setEnabled(bool(self.module_changes))
+
+    def apply_changes(self):
+        """Apply pending changes with one module command run per kind of change"""
+        self.apply_timer.stop()
+        if self.module_changes:
+            if self.stage_checkbox.isChecked():
+                self.report_event("Staged changes applied")
+            changes = self.module_changes
+            self.module_changes = ModuleChanges()
+            self.modulecmd_eval_commands(changes.commands(), changes)
+            self.mark_staged_changes()
+
+    def toggle_staging(self, checked: bool):
+        """Enter or leave staging mode. Changes still pending are kept when
+        entering this mode and discarded when leaving it"""
+        self.apply_timer.stop()
+        if not checked and self.module_changes:
+            self.report_event("Staged changes discarded")
+            self.module_changes.clear()
+            self.mark_staged_changes()
+            self.refresh_loaded_modules()
+            self.refresh_avail_modules()
+
+    def show_info(self, position: QPoint, title: str, message: str):
+        """Report info message in WhatsThis window"""
+        if len(message):
             text = [
-                f"<u>Module Display for <b>{module.name}</b></u><br/>",
-                display_message.replace("\n", "<br/>"),
+                f"<u>{title}</u><br/>",
+                message.replace("\n", "<br/>"),
             ]
             QWhatsThis.showText(position, "\n".join(text))
 
+    def show_display(self, position: QPoint, module: Module):
+        """Report display info of selected module in WhatsThis window"""
+        title = f"Module Display for <b>{module.name}</b>"
+        self.runner.submit(
+            "info",
+            module.display,
+            self.modulecmd,
+            callback=lambda message: self.show_info(position, title, message),
+            errback=self.report_error,
+        )
+
     def show_help(self, position: QPoint, module: Module):
         """Report help info of selected module in WhatsThis window"""
-        help_message = module.help(self.modulecmd)
-        if len(help_message):
-            text = [
-                f"<u>Module Help for <b>{module.name}</b></u><br/>",
-                help_message.replace("\n", "<br/>"),
-            ]
-            QWhatsThis.showText(position, "\n".join(text))
+        title = f"Module Help for <b>{module.name}</b>"
+        self.runner.submit(
+            "info",
+            module.help,
+            self.modulecmd,
+            callback=lambda message: self.show_info(position, title, message),
+            errback=self.report_error,
+        )
 
     def show_saveshow(self, position: QPoint, collection: str):
         """Report display info of selected collection in WhatsThis window"""
-        display_message = self.modulecmd.saveshow(collection)
-        if len(display_message):
-            text = [
-                f"<u>Collection Display for <b>{collection}</b></u><br/>",
-                display_message.replace("\n", "<br/>"),
-            ]
-            QWhatsThis.showText(position, "\n".join(text))
+        title = f"Collection Display for <b>{collection}</b>"
+        self.runner.submit(
+            "info",
+            self.modulecmd.saveshow,
+            collection,
+            callback=lambda message: self.show_info(position, title, message),
+            errback=self.report_error,
+        )
 
     def unuse(self, modulepath: str):
         """Unuse specified modulepath"""
@@ -273,7 +1059,15 @@ class MoGui(
     def save(self):
         """Save default collection"""
         self.report_event("Collection 'default' saved")
-        self.modulecmd.eval("save")
+        # refresh saved collections widget if a new collection file is created
+        self.runner.submit(
+            None,
+            self.modulecmd.eval,
+            "save",
+            callback=lambda status: self.refresh_widgets(),
+            errback=self.report_error,
+            serial=True,
+        )
 
     def reset(self):
         """Reset to initial environment"""
@@ -314,6 +1108,17 @@ class MoGui(
             "<li><b>Click on a selected module item</b>: unload corresponding loaded\
                 module</li>",
             "<li><b>Right click</b>: display help of selected module item</li>",
+            "<li><b>Ctrl+F</b>: filter list to modules matching typed string</li>",
+            "<li><b>Search help</b> (Ctrl+E): also list modules whose whatis or\
+                help message contains typed words, highlighting them</li>",
+            "<li><b>Show hidden</b> (Ctrl+H): show hidden modules in available\
+                modules list</li>",
+            "<li><b>Tree view</b> (Ctrl+T): group available modules by name, \
+                versions being shown when name is expanded</li>",
+            "<li><b>Stage changes</b>: mark modules to load or unload instead of\
+                applying each change immediately</li>",
+            "<li><b>Apply</b> (Ctrl+Return): load and unload marked modules at\
+                once</li>",
             "</ul>",
             "<h3>Loaded modules</h3>",
             "<p>This section of the application lists the environment modules currently\
@@ -353,220 +1158,16 @@ class MoGui(
 
     def close(self):
         """Save application properties and quit"""
+        # environment change code of clicks not yet applied and of ongoing module
+        # commands should reach parent shell
+        if self.apply_timer.isActive():
+            self.apply_changes()
+        self.runner.shutdown()
+        if self.initial_env is not None:
+            self.print_out_net_env_change()
         self.writeSettings()
         super().close()
 
     def closeEvent(self, event: QEvent):  # pylint: disable=invalid-name,unused-argument
         """Properly close application when clicking window manager exit button"""
         self.close()
-
-
-class ModuleGui(QStandardItem):  # pylint: disable=too-few-public-methods
-    """Represents a module: a name and a version"""
-
-    def __init__(self, module):
-        super().__init__(module.name)
-        self.setEditable(False)
-        self.module = module
-
-
-class ModulesView(QTableView):
-    """List modules in a table"""
-
-    def __init__(self, show_info, selectable_item, parent=None):
-        super().__init__(parent)
-
-        # initial properties (table is empty)
-        self.module_list = []
-        self.rows_per_col = 1
-        self.fixed_cols = 6
-
-        self.model = QStandardItemModel()
-        self.setModel(self.model)
-
-        # hide headers
-        horizontal_header = QHeaderView(Qt.Horizontal)
-        vertical_header = QHeaderView(Qt.Vertical)
-        horizontal_header.setVisible(False)
-        horizontal_header.setDefaultSectionSize(150)
-        vertical_header.setVisible(False)
-        self.setHorizontalHeader(horizontal_header)
-        self.setVerticalHeader(vertical_header)
-
-        # no table grid displayed
-        self.setGridStyle(Qt.NoPen)
-
-        self.selectable_item = selectable_item
-
-        self.show_info = show_info
-        self.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.on_right_clicked)
-
-    def changed_module_list(self, new_module_list: list[Module]):
-        """Test whether provided module list is different than one currently recorded"""
-        changed = len(self.module_list) != len(new_module_list)
-        if not changed:
-            for index, new_module in enumerate(new_module_list):
-                if self.module_list[index].name != new_module.name:
-                    changed = True
-                    break
-        return changed
-
-    def get_module_index(self, searched_module: Module):
-        """Return index of matching module in recorded list"""
-        for index, module in enumerate(self.module_list):
-            if module.name == searched_module.name:
-                return index
-        return None
-
-    def get_module_from_index(self, index):
-        """Return Module object found at given index"""
-        item = self.model.item(index.row(), index.column())
-        if item is None:
-            module = None
-        else:
-            module = item.module
-        return module
-
-    def refresh(self, module_list: list[Module]):
-        """Clear then fill widget with provided modules. Only clear selection if provided modules
-        are not the same than those currently set"""
-        if self.changed_module_list(module_list):
-            self.model.clear()
-            self.module_list = module_list
-
-            # fill table with provided modules
-            self.rows_per_col = math.ceil(len(module_list) / self.fixed_cols)
-            col = 0
-            row = 0
-            for module in module_list:
-                item = ModuleGui(module)
-                item.setSelectable(self.selectable_item)
-                self.model.setItem(row, col, item)
-                row += 1
-                if row == self.rows_per_col:
-                    col += 1
-                    row = 0
-        else:
-            self.selectionModel().clear()
-
-    def get_module_row_and_col(self, module: Module):
-        """Return list of row and column indexes in table for specified module"""
-        module_index = self.get_module_index(module)
-        if module_index is None:
-            col = None
-            row = None
-        else:
-            col = math.floor(module_index / self.rows_per_col)
-            row = module_index % self.rows_per_col
-        return [row, col]
-
-    def on_right_clicked(self, position: QPoint):
-        """Show info message of selected module item"""
-        index = self.indexAt(position)
-        module = self.get_module_from_index(index)
-        if module is not None:
-            absolute_position = self.pos() + position
-            self.show_info(absolute_position, module)
-
-
-class AvailModulesView(ModulesView):
-    """List available modules"""
-
-    def __init__(self, load, unload, show_info, parent=None):
-        super().__init__(show_info, True, parent)
-
-        # multiple items can be individually selected in table
-        self.setSelectionBehavior(QAbstractItemView.SelectItems)
-        self.setSelectionMode(QAbstractItemView.MultiSelection)
-
-        self.load = load
-        self.unload = unload
-        self.clicked.connect(self.on_clicked)
-
-    def select(self, module_list: list[Module]):
-        """Select given modules in the list"""
-        selection = self.selectionModel()
-        for module in module_list:
-            row, col = self.get_module_row_and_col(module)
-            if row is not None and col is not None:
-                item_index = self.model.item(row, col).index()
-                selection.select(item_index, QItemSelectionModel.Select)
-
-    def on_clicked(self, index):
-        """Load or unload selected or deselected item module"""
-        module = self.get_module_from_index(index)
-        if module is not None:
-            if self.selectionModel().isSelected(index):
-                self.load(module)
-            else:
-                self.unload(module)
-
-
-class LoadedModulesView(ModulesView):
-    """List loaded modules"""
-
-    def __init__(self, unload, show_info, parent=None):
-        super().__init__(show_info, False, parent)
-
-        self.unload = unload
-        self.doubleClicked.connect(self.on_double_clicked)
-
-    def on_double_clicked(self, index):
-        """Unload double clicked item module"""
-        module = self.model.item(index.row(), index.column()).module
-        self.unload(module)
-
-
-class StringsView(QListView):
-    """List strings"""
-
-    def __init__(self, double_clicked_action, right_clicked_action=None, parent=None):
-        super().__init__(parent)
-
-        self.string_list = []
-
-        self.model = QStandardItemModel()
-        self.setModel(self.model)
-
-        self.double_clicked_action = double_clicked_action
-        self.doubleClicked.connect(self.on_double_clicked)
-
-        self.right_clicked_action = right_clicked_action
-        if right_clicked_action:
-            self.setContextMenuPolicy(Qt.CustomContextMenu)
-            self.customContextMenuRequested.connect(self.on_right_clicked)
-
-    def get_string_from_index(self, index):
-        """Return text string found at given index"""
-        item = self.model.item(index.row())
-        if item is None:
-            string = None
-        else:
-            string = item.text()
-        return string
-
-    def refresh(self, string_list: list[str]):
-        """Clear then fill widget with provided strings. Only update widget if provided
-        strings are not the same than those currently set"""
-        if self.string_list != string_list:
-            self.model.clear()
-            self.string_list = string_list
-            for string in string_list:
-                item = QStandardItem(string)
-                item.setSelectable(False)
-                self.model.appendRow(item)
-
-    def on_double_clicked(self, index):
-        """Apply defined action on double clicked item string"""
-        string = self.get_string_from_index(index)
-        if string is not None:
-            self.double_clicked_action(string)
-
-    def on_right_clicked(self, position: QPoint):
-        """Apply defined action on selected item string"""
-        index = self.indexAt(position)
-        string = self.get_string_from_index(index)
-        if string is not None:
-            absolute_position = self.pos() + position
-            self.right_clicked_action(absolute_position, string)
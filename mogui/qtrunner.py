@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""MOGUI.QTRUNNER, background execution of module commands for QT GUI"""
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+from PyQt5.QtCore import (
+    QObject,
+    QRunnable,
+    QThreadPool,
+    pyqtSignal,
+)
+
+from mogui.utils import print_error
+
+
+class TaskSignals(QObject):  # pylint: disable=too-few-public-methods
+    """Signals reporting the outcome of a background task"""
+
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+    progress = pyqtSignal(object, object)
+
+
+class Task(
+    QRunnable
+):  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Call a function in a worker thread and report its outcome through signals
+
+    Args:
+        key: request name, a newer task with the same key supersedes this one
+        function: callable to run in worker thread
+        args: arguments to pass to function
+    """
+
+    def __init__(self, key, function, *args):
+        super().__init__()
+        # task object is kept by ModulecmdRunner until its outcome is reported
+        self.setAutoDelete(False)
+        self.key = key
+        self.function = function
+        self.args = args
+        self.generation = 0
+        self.callback = None
+        self.errback = None
+        self.progressback = None
+        self.serial = False
+        self.quiet = False
+        # set when application quits, outcome of task is not reported anymore
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def report_progress(self, value):
+        """Emit signal reporting partial result of function"""
+        if not self.cancelled:
+            self.signals.progress.emit(self, value)
+
+    def run(self):
+        """Call function and emit signal reporting its result or raised exception.
+        If partial results are expected, function is given a 'progress' callable to
+        report them"""
+        try:
+            if self.progressback is not None:
+                result = self.function(*self.args, progress=self.report_progress)
+            else:
+                result = self.function(*self.args)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            if not self.cancelled:
+                self.signals.failed.emit(self, error)
+        else:
+            if not self.cancelled:
+                self.signals.finished.emit(self, result)
+
+
+class ModulecmdRunner(QObject):
+    """Run module command requests in background threads
+
+    Requests updating environment are serialized in a dedicated thread, as they
+    modify environment of current process. Query requests run concurrently. A
+    request superseded by a newer one with the same key is cancelled if not yet
+    started, or its outcome is dropped otherwise. Outcomes are reported through
+    callbacks called in GUI thread.
+    """
+
+    busy = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.query_pool = QThreadPool(self)
+        self.eval_pool = QThreadPool(self)
+        self.eval_pool.setMaxThreadCount(1)
+        self.tasks = []
+        self.generations = {}
+        # set when application quits, long requests may check it to stop early
+        self.stopping = False
+
+    def submit(
+        self,
+        key,
+        function,
+        *args,
+        callback=None,
+        errback=None,
+        progressback=None,
+        serial=False,
+        quiet=False,
+    ):  # pylint: disable=too-many-arguments
+        """Run function in background and call callback with its result
+
+        Args:
+            key: request name, outdated requests with same key are superseded.
+                None means request is never superseded
+            function: callable to run in worker thread
+            args: arguments to pass to function
+            callback: called in GUI thread with function result
+            errback: called in GUI thread with exception raised by function
+            progressback: called in GUI thread with partial results reported by
+                function through its 'progress' argument
+            serial: run in the thread dedicated to environment updates
+            quiet: do not report runner busy for this request, which is not
+                asked by user
+
+        Returns:
+            Submitted Task object
+        """
+        pool = self.eval_pool if serial else self.query_pool
+        if key is not None:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            # cancel outdated requests that are not started yet
+            for task in [task for task in self.tasks if task.key == key]:
+                if pool.tryTake(task):
+                    self.tasks.remove(task)
+
+        task = Task(key, function, *args)
+        task.generation = self.generations.get(key, 0)
+        task.callback = callback
+        task.errback = errback
+        task.progressback = progressback
+        task.serial = serial
+        task.quiet = quiet
+        task.signals.finished.connect(self.on_task_finished)
+        task.signals.failed.connect(self.on_task_failed)
+        task.signals.progress.connect(self.on_task_progress)
+        self.tasks.append(task)
+        if not quiet:
+            self.busy.emit(True)
+        pool.start(task)
+        return task
+
+    def is_outdated(self, task: Task):
+        """Tell if a newer request has superseded given task"""
+        return task.key is not None and task.generation != self.generations[task.key]
+
+    def release(self, task: Task):
+        """Forget about given task once its outcome is reported"""
+        if task in self.tasks:
+            self.tasks.remove(task)
+        if all(task.quiet for task in self.tasks):
+            self.busy.emit(False)
+
+    def on_task_finished(self, task: Task, result):
+        """Pass result of task to its callback unless task is outdated"""
+        self.release(task)
+        if not self.is_outdated(task) and task.callback is not None:
+            task.callback(result)
+
+    def on_task_progress(self, task: Task, value):
+        """Pass partial result of task to its progressback unless task is
+        outdated or already over"""
+        if task in self.tasks and not self.is_outdated(task):
+            task.progressback(value)
+
+    def on_task_failed(self, task: Task, error: Exception):
+        """Pass exception raised by task to its errback unless task is outdated"""
+        self.release(task)
+        if self.is_outdated(task):
+            return
+        if task.errback is not None:
+            task.errback(error)
+        else:
+            print_error(error)
+
+    def shutdown(self):
+        """Cancel query requests not started yet and stop reporting outcome of
+        running ones, then wait for all requests to complete, so no task outlives
+        the objects it reports to. Environment update requests are completed"""
+        self.stopping = True
+        self.query_pool.clear()
+        for task in self.tasks:
+            if not task.serial:
+                task.cancelled = True
+        self.eval_pool.waitForDone()
+        self.query_pool.waitForDone()
@@ -0,0 +1,729 @@
+# -*- coding: utf-8 -*-
+"""MOGUI.QTVIEWS, QT widgets listing modules, modulepaths and collections"""
+# Copyright (C) 2011-2024 Aurelien Cedeyn
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+import math
+
+from PyQt5.QtCore import (
+    QAbstractItemModel,
+    QAbstractTableModel,
+    QItemSelection,
+    QItemSelectionModel,
+    QModelIndex,
+    Qt,
+    QPoint,
+)
+
+from PyQt5.QtGui import (
+    QColor,
+    QFont,
+    QPalette,
+    QStandardItem,
+    QStandardItemModel,
+)
+
+from PyQt5.QtWidgets import (
+    QAbstractItemView,
+    QApplication,
+    QHeaderView,
+    QListView,
+    QTableView,
+    QTreeView,
+)
+
+from mogui.modules import Module
+from mogui.utils import get_list_diff
+
+
+# background color of tagged modules, after default colors of Modules
+TAG_COLORS = {
+    "forbidden": "#f28b82",
+    "nearly-forbidden": "#fdd663",
+    "sticky": "#78d9ec",
+    "super-sticky": "#8ab4f8",
+}
+# background color of modules matching search of their messages
+MATCH_COLOR = "#fff59d"
+
+
+def get_tag_color(module: Module):
+    """Return background color of first module tag having one, None otherwise"""
+    for tag in module.tags:
+        if tag in TAG_COLORS:
+            return TAG_COLORS[tag]
+    return None
+
+
+def get_module_color(module: Module, role: int, matched=False):
+    """Return background or foreground color of module depending on its tags and
+    on it matching a search, None if default color applies. Tag color takes
+    precedence over search match color"""
+    tag_color = get_tag_color(module)
+    if tag_color is None and matched:
+        tag_color = MATCH_COLOR
+    if role == Qt.BackgroundRole:
+        color = None if tag_color is None else QColor(tag_color)
+    # keep text readable over tag background color
+    elif tag_color is not None:
+        color = QColor(Qt.black)
+    elif module.is_hidden():
+        color = QApplication.palette().color(QPalette.Disabled, QPalette.Text)
+    else:
+        color = None
+    return color
+
+
+def get_module_font(module: Module, pending_names: set, matched_names: set):
+    """Return font of module, italic if it has a pending change and bold if it
+    matches a search, None if default font applies"""
+    pending = module.name in pending_names
+    matched = module.name in matched_names
+    if not pending and not matched:
+        return None
+    font = QFont()
+    font.setItalic(pending)
+    font.setBold(matched)
+    return font
+
+
+def get_module_tooltip(module: Module):
+    """Return tooltip text describing module, or None if there is nothing to
+    tell about it"""
+    lines = []
+    if module.whatis:
+        lines.append(module.whatis)
+    if module.module_type == "alias" and module.target:
+        lines.append(f"Alias of: {module.target}")
+    if module.symbols:
+        lines.append(f"Symbolic versions: {', '.join(module.symbols)}")
+    if module.tags:
+        lines.append(f"Tags: {', '.join(module.tags)}")
+    return "\n".join(lines) or None
+
+
+class ModulesModel(QAbstractTableModel):  # pylint: disable=too-many-instance-attributes
+    """Table model spreading modules over a fixed number of columns. Items are
+    computed from their row and column, no object is created per module
+
+    Args:
+        selectable_item: tell if module items can be selected
+        fixed_cols: number of columns to spread modules over
+    """
+
+    def __init__(self, selectable_item, fixed_cols=6, parent=None):
+        super().__init__(parent)
+
+        # initial properties (table is empty)
+        self.module_list = []
+        self.module_names = ()
+        self.module_index = {}
+        self.rows_per_col = 1
+        self.row_count = 0
+        self.col_count = 0
+        self.fixed_cols = fixed_cols
+        self.selectable_item = selectable_item
+        self.pending_names = set()
+        self.matched_names = set()
+
+    def update_module_list(self, module_list: list[Module]):
+        """Replace modules presented by model. Only the rows and columns added or
+        removed and the cells whose content changed are reported to the views
+
+        Returns:
+            Boolean telling if module list changed
+        """
+        # name tuple is the fingerprint of module list
+        module_names = tuple(module.name for module in module_list)
+        diff = get_list_diff(self.module_names, module_names)
+        self.module_list = module_list
+        if diff is None:
+            return False
+
+        start, old_end, new_end = diff
+        old_count = len(self.module_names)
+        self.update_module_index(module_names, start, old_end, new_end)
+        self.module_names = module_names
+
+        rows_per_col = max(math.ceil(len(module_list) / self.fixed_cols), 1)
+        layout_changed = rows_per_col != self.rows_per_col
+        self.rows_per_col = rows_per_col
+        self.resize_table(
+            rows_per_col if module_list else 0,
+            math.ceil(len(module_list) / rows_per_col),
+        )
+
+        # report cells whose module changed, every cell if modules are spread
+        # differently over the columns. Cells emptied at the end of table are
+        # reported too
+        if old_end - start == new_end - start:
+            last_index = new_end - 1
+        else:
+            last_index = max(len(module_list), old_count) - 1
+        self.report_changed_cells(0 if layout_changed else start, last_index)
+        return True
+
+    def update_module_index(self, module_names, start, old_end, new_end):
+        """Update name to index map with changed part of module list"""
+        new_changed_names = set(module_names[start:new_end])
+        for name in self.module_names[start:old_end]:
+            if name not in new_changed_names:
+                del self.module_index[name]
+        # module indexes after the changed part shift if its length changed
+        if old_end - start == new_end - start:
+            shifted_names = module_names[start:new_end]
+        else:
+            shifted_names = module_names[start:]
+        for index, name in enumerate(shifted_names, start):
+            self.module_index[name] = index
+
+    def report_changed_cells(self, first_index: int, last_index: int):
+        """Emit dataChanged signal for the cells of modules between given
+        indexes"""
+        if last_index < first_index or not self.row_count:
+            return
+        first_row, first_col = self.get_row_and_col(first_index)
+        last_row, last_col = self.get_row_and_col(last_index)
+        if first_col != last_col:
+            first_row = 0
+            last_row = self.row_count - 1
+        self.dataChanged.emit(
+            self.index(first_row, first_col),
+            self.index(last_row, min(last_col, self.col_count - 1)),
+        )
+
+    def resize_table(self, row_count: int, col_count: int):
+        """Add or remove rows and columns at the end of table"""
+        if row_count > self.row_count:
+            self.beginInsertRows(QModelIndex(), self.row_count, row_count - 1)
+            self.row_count = row_count
+            self.endInsertRows()
+        elif row_count < self.row_count:
+            self.beginRemoveRows(QModelIndex(), row_count, self.row_count - 1)
+            self.row_count = row_count
+            self.endRemoveRows()
+        if col_count > self.col_count:
+            self.beginInsertColumns(QModelIndex(), self.col_count, col_count - 1)
+            self.col_count = col_count
+            self.endInsertColumns()
+        elif col_count < self.col_count:
+            self.beginRemoveColumns(QModelIndex(), col_count, self.col_count - 1)
+            self.col_count = col_count
+            self.endRemoveColumns()
+
+    def get_row_and_col(self, module_index: int):
+        """Return list of row and column indexes in table for module at given
+        index in module list"""
+        col = math.floor(module_index / self.rows_per_col)
+        row = module_index % self.rows_per_col
+        return [row, col]
+
+    def get_module(self, index: QModelIndex):
+        """Return Module object found at given index or None if cell is empty"""
+        if not index.isValid():
+            return None
+        module_index = index.column() * self.rows_per_col + index.row()
+        if module_index >= len(self.module_list):
+            return None
+        return self.module_list[module_index]
+
+    def rowCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Return number of rows in table"""
+        if parent.isValid():
+            return 0
+        return self.row_count
+
+    def columnCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Return number of columns in table"""
+        if parent.isValid():
+            return 0
+        return self.col_count
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        """Return module name to display, its details and whatis message once
+        fetched as tooltip, and colors depending on its tags or on search match"""
+        module = self.get_module(index)
+        if module is None:
+            return None
+        if role == Qt.DisplayRole:
+            return module.name
+        if role == Qt.ToolTipRole:
+            return get_module_tooltip(module)
+        if role == Qt.FontRole:
+            return get_module_font(module, self.pending_names, self.matched_names)
+        if role in (Qt.BackgroundRole, Qt.ForegroundRole):
+            return get_module_color(module, role, module.name in self.matched_names)
+        return None
+
+    def flags(self, index: QModelIndex):
+        """Return item flags, empty cells cannot be interacted with"""
+        if self.get_module(index) is None:
+            return Qt.NoItemFlags
+        if self.selectable_item:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled
+
+
+class ModulesViewMixin:
+    """Behavior shared by widgets presenting modules through a model defining
+    module_list, get_module, pending_names and matched_names. Widget defines
+    show_info"""
+
+    @property
+    def module_list(self):
+        """Modules currently presented in widget"""
+        return self.model.module_list
+
+    def get_module_from_index(self, index):
+        """Return Module object found at given index"""
+        return self.model.get_module(index)
+
+    def mark_pending(self, module_names: list[str]):
+        """Show given modules as having a pending change"""
+        self.model.pending_names = set(module_names)
+        self.viewport().update()
+
+    def mark_matched(self, module_names: set[str]):
+        """Highlight given modules as matching a search of their messages"""
+        self.model.matched_names = module_names
+        self.viewport().update()
+
+    def on_right_clicked(self, position: QPoint):
+        """Show info message of selected module item"""
+        index = self.indexAt(position)
+        module = self.get_module_from_index(index)
+        if module is not None:
+            absolute_position = self.pos() + position
+            self.show_info(absolute_position, module)
+
+
+class AvailModulesViewMixin(ModulesViewMixin):
+    """Behavior shared by widgets presenting available modules. Widget defines
+    load and unload"""
+
+    def on_clicked(self, index):
+        """Load or unload selected or deselected item module"""
+        module = self.get_module_from_index(index)
+        if module is not None:
+            if self.selectionModel().isSelected(index):
+                self.load(module)
+            else:
+                self.unload(module)
+
+
+class ModulesView(ModulesViewMixin, QTableView):
+    """List modules in a table"""
+
+    def __init__(self, show_info, selectable_item, parent=None):
+        super().__init__(parent)
+
+        self.model = ModulesModel(selectable_item)
+        self.setModel(self.model)
+
+        # hide headers
+        horizontal_header = QHeaderView(Qt.Horizontal)
+        vertical_header = QHeaderView(Qt.Vertical)
+        horizontal_header.setVisible(False)
+        horizontal_header.setDefaultSectionSize(150)
+        vertical_header.setVisible(False)
+        self.setHorizontalHeader(horizontal_header)
+        self.setVerticalHeader(vertical_header)
+
+        # no table grid displayed
+        self.setGridStyle(Qt.NoPen)
+
+        self.show_info = show_info
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.on_right_clicked)
+
+    def get_module_index(self, searched_module: Module):
+        """Return index of matching module in recorded list"""
+        return self.model.module_index.get(searched_module.name)
+
+    def refresh(self, module_list: list[Module]):
+        """Update widget with the differences between provided modules and those
+        currently set, then clear selection"""
+        self.model.update_module_list(module_list)
+        self.selectionModel().clear()
+
+    def get_module_row_and_col(self, module: Module):
+        """Return list of row and column indexes in table for specified module"""
+        module_index = self.get_module_index(module)
+        if module_index is None:
+            return [None, None]
+        return self.model.get_row_and_col(module_index)
+
+
+class AvailModulesView(  # pylint: disable=too-many-ancestors
+    AvailModulesViewMixin, ModulesView
+):
+    """List available modules"""
+
+    def __init__(self, load, unload, show_info, parent=None):
+        super().__init__(show_info, True, parent)
+
+        # multiple items can be individually selected in table
+        self.setSelectionBehavior(QAbstractItemView.SelectItems)
+        self.setSelectionMode(QAbstractItemView.MultiSelection)
+
+        self.load = load
+        self.unload = unload
+        self.clicked.connect(self.on_clicked)
+
+    def select(self, module_list: list[Module]):
+        """Select given modules in the list"""
+        selection = QItemSelection()
+        for module in module_list:
+            row, col = self.get_module_row_and_col(module)
+            if row is not None and col is not None:
+                item_index = self.model.index(row, col)
+                selection.select(item_index, item_index)
+        # apply all selections at once
+        self.selectionModel().select(selection, QItemSelectionModel.Select)
+
+
+def get_group_name(module: Module):
+    """Return name modules are grouped under in tree, which is module name
+    without its version part"""
+    return module.name.rpartition("/")[0] or module.name
+
+
+def get_version_name(module: Module):
+    """Return version part of module name, empty if module has no version"""
+    _, separator, version = module.name.rpartition("/")
+    return version if separator else ""
+
+
+class ModulesTreeModel(
+    QAbstractItemModel
+):  # pylint: disable=too-many-instance-attributes
+    """Modules grouped by name in a two-level tree
+
+    Top-level rows are module names, with the symbolic versions of their
+    versions. Versions are child rows, only inserted in model when their parent
+    row is expanded, so model initially costs the number of distinct names. A
+    module without version is a top-level row with no child.
+    """
+
+    headers = ["Module", "Symbolic versions"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.module_list = []
+        self.module_names = ()
+        self.group_names = []
+        self.group_rows = {}
+        self.group_modules = []
+        # group rows whose versions are inserted in model
+        self.fetched_groups = set()
+        self.pending_names = set()
+        self.matched_names = set()
+
+    def update_module_list(self, module_list: list[Module]):
+        """Group given modules by name and reset model with them
+
+        Returns:
+            True if modules changed, False otherwise
+        """
+        module_names = tuple(mod.name for mod in module_list)
+        if module_names == self.module_names:
+            return False
+
+        group_names = []
+        group_modules = []
+        group_rows = {}
+        for module in module_list:
+            group_name = get_group_name(module)
+            if group_name not in group_rows:
+                group_rows[group_name] = len(group_names)
+                group_names.append(group_name)
+                group_modules.append([])
+            group_modules[group_rows[group_name]].append(module)
+
+        self.beginResetModel()
+        self.module_list = module_list
+        self.module_names = module_names
+        self.group_names = group_names
+        self.group_rows = group_rows
+        self.group_modules = group_modules
+        self.fetched_groups = set()
+        self.endResetModel()
+        return True
+
+    def is_leaf_group(self, row: int):
+        """Tell if top-level row is a module without version"""
+        modules = self.group_modules[row]
+        return len(modules) == 1 and modules[0].name == self.group_names[row]
+
+    def get_group_symbols(self, row: int):
+        """Return text listing symbolic versions of group modules"""
+        symbols = []
+        for module in self.group_modules[row]:
+            version = get_version_name(module)
+            for symbol in module.symbols or ():
+                symbols.append(f"{symbol}: {version}")
+        return ", ".join(symbols)
+
+    def index(self, row, column, parent=QModelIndex()):
+        """Return index of item, internal id of version items being their parent
+        row plus one"""
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+
+    def parent(self, index=None):  # pylint: disable=arguments-differ
+        """Return index of parent item, or parent object if no index given"""
+        if index is None:
+            return super().parent()
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Return number of module names or of inserted versions of a name"""
+        if not parent.isValid():
+            return len(self.group_names)
+        if parent.internalId() == 0 and parent.row() in self.fetched_groups:
+            return len(self.group_modules[parent.row()])
+        return 0
+
+    def columnCount(
+        self, parent=QModelIndex()
+    ):  # pylint: disable=invalid-name,unused-argument
+        """Return number of columns in tree"""
+        return len(self.headers)
+
+    def hasChildren(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Tell if item has versions, even if they are not inserted yet"""
+        if not parent.isValid():
+            return bool(self.group_names)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return not self.is_leaf_group(parent.row())
+        return False
+
+    def canFetchMore(self, parent):  # pylint: disable=invalid-name
+        """Tell if versions of module name are not inserted yet"""
+        return (
+            parent.isValid()
+            and parent.internalId() == 0
+            and parent.row() not in self.fetched_groups
+            and not self.is_leaf_group(parent.row())
+        )
+
+    def fetchMore(self, parent):  # pylint: disable=invalid-name
+        """Insert versions of module name"""
+        if self.canFetchMore(parent):
+            row = parent.row()
+            self.beginInsertRows(parent, 0, len(self.group_modules[row]) - 1)
+            self.fetched_groups.add(row)
+            self.endInsertRows()
+
+    def get_module(self, index: QModelIndex):
+        """Return Module object found at given index or None if item is a module
+        name grouping versions"""
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            if self.is_leaf_group(index.row()):
+                return self.group_modules[index.row()][0]
+            return None
+        return self.group_modules[index.internalId() - 1][index.row()]
+
+    def get_module_index(self, module: Module):
+        """Return index of given module, inserting versions of its name in model
+        if needed. Invalid index is returned if module is not in model"""
+        row = self.group_rows.get(get_group_name(module))
+        if row is None:
+            return QModelIndex()
+        group_index = self.index(row, 0)
+        if self.is_leaf_group(row):
+            return group_index
+        for child_row, child in enumerate(self.group_modules[row]):
+            if child.name == module.name:
+                self.fetchMore(group_index)
+                return self.index(child_row, 0, group_index)
+        return QModelIndex()
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        """Return module name or version to display, and module details as
+        tooltip. Symbolic versions of a name are shown on its row"""
+        module = self.get_module(index)
+        if role == Qt.DisplayRole and index.isValid():
+            return self.get_display_text(index, module)
+        if module is None:
+            return None
+        if role == Qt.ToolTipRole:
+            return get_module_tooltip(module)
+        if role == Qt.FontRole:
+            return get_module_font(module, self.pending_names, self.matched_names)
+        if role in (Qt.BackgroundRole, Qt.ForegroundRole):
+            return get_module_color(module, role, module.name in self.matched_names)
+        return None
+
+    def get_display_text(self, index: QModelIndex, module: Module):
+        """Return text to display for item, versions being shown without their
+        module name"""
+        if module is None:
+            if index.column() == 0:
+                text = self.group_names[index.row()]
+            else:
+                text = self.get_group_symbols(index.row())
+        elif index.column() == 1:
+            text = ", ".join(module.symbols or ())
+        elif index.internalId() == 0:
+            text = module.name
+        else:
+            text = get_version_name(module)
+        return text
+
+    def headerData(
+        self, section, orientation, role=Qt.DisplayRole
+    ):  # pylint: disable=invalid-name
+        """Return column titles"""
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index: QModelIndex):
+        """Return item flags, only module items can be selected"""
+        if self.get_module(index) is None:
+            return Qt.ItemIsEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+
+class AvailModulesTreeView(AvailModulesViewMixin, QTreeView):
+    """List available modules grouped by name in a tree"""
+
+    def __init__(self, load, unload, show_info, parent=None):
+        super().__init__(parent)
+
+        self.model = ModulesTreeModel()
+        self.setModel(self.model)
+        self.setUniformRowHeights(True)
+        self.header().setDefaultSectionSize(250)
+
+        # multiple modules can be individually selected in tree
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.MultiSelection)
+
+        self.load = load
+        self.unload = unload
+        self.show_info = show_info
+        self.clicked.connect(self.on_clicked)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.on_right_clicked)
+
+    def refresh(self, module_list: list[Module]):
+        """Update widget with provided modules, keeping expanded module names,
+        then clear selection"""
+        expanded_names = [
+            name
+            for row, name in enumerate(self.model.group_names)
+            if row in self.model.fetched_groups
+            and self.isExpanded(self.model.index(row, 0))
+        ]
+        if self.model.update_module_list(module_list):
+            for name in expanded_names:
+                row = self.model.group_rows.get(name)
+                if row is not None:
+                    self.expand(self.model.index(row, 0))
+        self.selectionModel().clear()
+
+    def select(self, module_list: list[Module]):
+        """Select given modules in the tree"""
+        selection = QItemSelection()
+        for module in module_list:
+            index = self.model.get_module_index(module)
+            if index.isValid():
+                selection.select(index, index.sibling(index.row(), 1))
+        # apply all selections at once
+        self.selectionModel().select(selection, QItemSelectionModel.Select)
+
+
+class LoadedModulesView(ModulesView):
+    """List loaded modules"""
+
+    def __init__(self, unload, show_info, parent=None):
+        super().__init__(show_info, False, parent)
+
+        self.unload = unload
+        self.doubleClicked.connect(self.on_double_clicked)
+
+    def on_double_clicked(self, index):
+        """Unload double clicked item module"""
+        module = self.get_module_from_index(index)
+        if module is not None:
+            self.unload(module)
+
+
+class StringsView(QListView):
+    """List strings"""
+
+    def __init__(self, double_clicked_action, right_clicked_action=None, parent=None):
+        super().__init__(parent)
+
+        self.string_list = []
+
+        self.model = QStandardItemModel()
+        self.setModel(self.model)
+
+        self.double_clicked_action = double_clicked_action
+        self.doubleClicked.connect(self.on_double_clicked)
+
+        self.right_clicked_action = right_clicked_action
+        if right_clicked_action:
+            self.setContextMenuPolicy(Qt.CustomContextMenu)
+            self.customContextMenuRequested.connect(self.on_right_clicked)
+
+    def get_string_from_index(self, index):
+        """Return text string found at given index"""
+        item = self.model.item(index.row())
+        if item is None:
+            string = None
+        else:
+            string = item.text()
+        return string
+
+    def refresh(self, string_list: list[str]):
+        """Update widget with the strings added or removed compared to those
+        currently set"""
+        diff = get_list_diff(self.string_list, string_list)
+        if diff is not None:
+            start, old_end, new_end = diff
+            self.model.removeRows(start, old_end - start)
+            for row, string in enumerate(string_list[start:new_end], start):
+                item = QStandardItem(string)
+                item.setSelectable(False)
+                self.model.insertRow(row, item)
+            self.string_list = string_list
+
+    def on_double_clicked(self, index):
+        """Apply defined action on double clicked item string"""
+        string = self.get_string_from_index(index)
+        if string is not None:
+            self.double_clicked_action(string)
+
+    def on_right_clicked(self, position: QPoint):
+        """Apply defined action on selected item string"""
+        index = self.indexAt(position)
+        string = self.get_string_from_index(index)
+        if string is not None:
+            absolute_position = self.pos() + position
+            self.right_clicked_action(absolute_position, string)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""MOGUI.SEARCH, indexes to search modules"""
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+import bisect
+import os
+import re
+import time
+
+from mogui.cache import get_cache_dir, read_cache_entries, write_json_file
+from mogui.modules import Module
+
+WORD_RE = re.compile(r"\w+")
+
+
+def get_trigrams(text: str):
+    """Return set of 3-character substrings of text"""
+    return set(map("".join, zip(text, text[1:], text[2:])))
+
+
+class ModuleIndex:  # pylint: disable=too-few-public-methods
+    """Trigram index over name and symbolic versions of modules, to find modules
+    containing a string
+
+    Args:
+        module_list: modules to index, in the order search results are returned
+    """
+
+    def __init__(self, module_list: list[Module]):
+        self.module_list = module_list
+        self.keys = []
+        self.trigrams = {}
+        for index, module in enumerate(module_list):
+            key = module.name.lower()
+            if module.symbols:
+                key += "\n" + "\n".join(module.symbols).lower()
+            self.keys.append(key)
+            for trigram in get_trigrams(key):
+                self.trigrams.setdefault(trigram, []).append(index)
+
+        # result of previous search, to narrow next query extending it
+        self.last_query = ""
+        self.last_matches = range(len(module_list))
+
+    def search(self, query: str):
+        """Return modules whose name or symbolic versions contain query string,
+        ignoring case
+
+        When query extends previous one, only the modules previously matched are
+        checked. Otherwise modules sharing the least common trigram of query are
+        checked.
+        """
+        query = query.lower()
+        candidates = range(len(self.module_list))
+        if self.last_query and self.last_query in query:
+            candidates = self.last_matches
+        for trigram in get_trigrams(query):
+            posting = self.trigrams.get(trigram, [])
+            if len(posting) < len(candidates):
+                candidates = posting
+
+        matches = [index for index in candidates if query in self.keys[index]]
+        self.last_query = query
+        self.last_matches = matches
+        return [self.module_list[index] for index in matches]
+
+
+def get_words(text: str):
+    """Return set of lowercase words found in text"""
+    return set(WORD_RE.findall(text.lower()))
+
+
+class TextIndex:
+    """Inverted index over whatis and help messages of modules, to find modules
+    by what they provide rather than by their name
+
+    Indexed words of each module are recorded with the stamp of its modulefile
+    (see Module.get_stamp), so only new or modified modules are indexed again
+    when index is updated. Modules without stamp are indexed again on each
+    update and are not kept in the persistent cache file.
+
+    Args:
+        entries: stamp and words of each indexed module name, read from cache
+            file if None
+        path: cache file location
+    """
+
+    format_version = 1
+
+    def __init__(self, entries=None, path=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), "text-index.json")
+        self.path = path
+        if entries is None:
+            entries = self.read_entries()
+        self.entries = entries
+        self.postings = {}
+        for name, (_, words) in entries.items():
+            self.add_postings(name, words)
+        # sorted words, to find those starting with a query word
+        self.vocabulary = None
+
+    def read_entries(self):
+        """Return indexed modules recorded in cache file"""
+        entries = read_cache_entries(self.path, self.format_version)
+        return {name: (tuple(stamp), words) for name, (stamp, words) in entries.items()}
+
+    def save(self):
+        """Record indexed modules in cache file"""
+        entries = {
+            name: entry for name, entry in self.entries.items() if entry[0] is not None
+        }
+        write_json_file(self.path, {"version": self.format_version, "entries": entries})
+
+    def add_postings(self, name: str, words: list[str]):
+        """Reference module name in posting list of its words"""
+        for word in words:
+            self.postings.setdefault(word, set()).add(name)
+
+    def remove(self, name: str):
+        """Remove module from index"""
+        _, words = self.entries.pop(name)
+        for word in words:
+            posting = self.postings[word]
+            posting.discard(name)
+            if not posting:
+                del self.postings[word]
+        self.vocabulary = None
+
+    def add(self, name: str, stamp: tuple, text: str):
+        """Index text of module, replacing text previously indexed for it"""
+        if name in self.entries:
+            self.remove(name)
+        words = sorted(get_words(text))
+        self.entries[name] = (stamp, words)
+        self.add_postings(name, words)
+        self.vocabulary = None
+
+    def get_outdated(self, module_list: list[Module]):
+        """Return modules not indexed yet or whose modulefile changed since they
+        were indexed"""
+        outdated = []
+        for module in module_list:
+            entry = self.entries.get(module.name)
+            stamp = module.get_stamp()
+            if entry is None or stamp is None or entry[0] != stamp:
+                outdated.append(module)
+        return outdated
+
+    def update(
+        self, module_list: list[Module], modulecmd, progress=None, cancelled=None
+    ):
+        """Index whatis and help messages of new or modified modules and remove
+        modules that are not available anymore. Help message of each module is
+        fetched unless cached by module command
+
+        Args:
+            module_list: available modules
+            modulecmd: Modulecmd object to fetch messages with
+            progress: called regularly with number of modules left to index
+            cancelled: called before indexing each module, indexing stops if it
+                returns True. Modules indexed so far are kept
+        """
+        names = {module.name for module in module_list}
+        for name in [name for name in self.entries if name not in names]:
+            self.remove(name)
+
+        outdated = self.get_outdated(module_list)
+        last_report = time.monotonic()
+        for count, module in enumerate(outdated):
+            if cancelled is not None and cancelled():
+                break
+            # stamp is taken before fetching help, which may change meanwhile
+            stamp = module.get_stamp()
+            text = f"{module.whatis or ''}\n{module.help(modulecmd)}"
+            self.add(module.name, stamp, text)
+            if progress is not None and time.monotonic() - last_report > 0.5:
+                last_report = time.monotonic()
+                progress(len(outdated) - count)
+
+    def search(self, query: str):
+        """Return names of modules whose messages contain all query words, last
+        query word being also matched as the start of a word"""
+        query_words = WORD_RE.findall(query.lower())
+        if not query_words:
+            return set()
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+
+        matches = None
+        for i, query_word in enumerate(query_words):
+            if i < len(query_words) - 1:
+                names = self.postings.get(query_word, set())
+            else:
+                # word may still be being typed
+                names = set()
+                start = bisect.bisect_left(self.vocabulary, query_word)
+                for word in self.vocabulary[start:]:
+                    if not word.startswith(query_word):
+                        break
+                    names |= self.postings[word]
+            matches = names if matches is None else matches & names
+        return matches
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""MOGUI.SHELL, shell code reproducing environment changes"""
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+import shlex
+
+
+class ShellCode:
+    """Generic shell code generation class"""
+
+    def __init__(self, shell: str):
+        self.shell = shell
+
+    def quote(self, value: str):
+        """Return value quoted for shell"""
+        raise NotImplementedError()
+
+    def set_var(self, name: str, value: str):
+        """Return shell code to set environment variable"""
+        raise NotImplementedError()
+
+    def unset_var(self, name: str):
+        """Return shell code to unset environment variable"""
+        raise NotImplementedError()
+
+    def chdir(self, path: str):
+        """Return shell code to change current working directory"""
+        return f"cd {self.quote(path)};"
+
+    def env_change(self, env_before: dict, env_after: dict):
+        """Return shell code turning environment 'env_before' into 'env_after'"""
+        code = []
+        for name, value in env_after.items():
+            if env_before.get(name) != value:
+                code.append(self.set_var(name, value))
+        for name in env_before:
+            if name not in env_after:
+                code.append(self.unset_var(name))
+        return "\n".join(code)
+
+
+class ShShellCode(ShellCode):
+    """Sh-specific shell code generation class"""
+
+    def quote(self, value):
+        return shlex.quote(value)
+
+    def set_var(self, name, value):
+        return f"{name}={self.quote(value)}; export {name};"
+
+    def unset_var(self, name):
+        return f"unset {name};"
+
+
+class CshShellCode(ShellCode):
+    """Csh-specific shell code generation class"""
+
+    def quote(self, value):
+        value = value.replace("'", "'\\''").replace("!", "\\!").replace("\n", "\\\n")
+        return f"'{value}'"
+
+    def set_var(self, name, value):
+        return f"setenv {name} {self.quote(value)};"
+
+    def unset_var(self, name):
+        return f"unsetenv {name};"
+
+
+class FishShellCode(ShellCode):
+    """Fish-specific shell code generation class"""
+
+    # variables fish handles as lists
+    path_vars = ["PATH", "CDPATH", "MANPATH"]
+
+    def quote(self, value):
+        value = value.replace("\\", "\\\\").replace("'", "\\'")
+        return f"'{value}'"
+
+    def set_var(self, name, value):
+        if name in self.path_vars:
+            value_code = " ".join(self.quote(elt) for elt in value.split(":"))
+        else:
+            value_code = self.quote(value)
+        return f"set -xg {name} {value_code};"
+
+    def unset_var(self, name):
+        return f"set -e {name};"
+
+
+def get_shell_code(shell: str):
+    """Return shell code generation object for given shell"""
+    if shell in ["sh", "bash", "ksh", "zsh"]:
+        shell_code = ShShellCode(shell)
+    elif shell in ["csh", "tcsh"]:
+        shell_code = CshShellCode(shell)
+    else:
+        shell_code = FishShellCode(shell)
+    return shell_code
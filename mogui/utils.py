@@ -28,3 +28,29 @@ def print_debug(message):
 def print_error(message):
     """Print message with error prefix on stderr"""
     print(f"ERROR: {message}", file=sys.stderr)
+
+
+def get_list_diff(old_list, new_list):
+    """Locate the part of a list that changed, once elements common to the start
+    and to the end of both lists are set aside
+
+    Returns:
+        None if lists are equal. Otherwise list of start index of changed part,
+        end index of changed part in old list and end index in new list
+    """
+    if old_list == new_list:
+        return None
+    common_len = min(len(old_list), len(new_list))
+    start = 0
+    while start < common_len and old_list[start] == new_list[start]:
+        start += 1
+    old_end = len(old_list)
+    new_end = len(new_list)
+    while (
+        old_end > start
+        and new_end > start
+        and old_list[old_end - 1] == new_list[new_end - 1]
+    ):
+        old_end -= 1
+        new_end -= 1
+    return [start, old_end, new_end]
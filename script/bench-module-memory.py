@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# BENCH-MODULE-MEMORY, measure footprint of available modules table
+# Copyright (C)      2024 Xavier Delaruelle
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+##########################################################################
+
+"""Build available modules table (like Modulecmd.avail_mods) from synthetic
+avail JSON output of 10k, 50k and 100k modules and report memory it takes.
+Module objects are compared with plain objects holding same attributes in
+their __dict__"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+# run from repository without installing mogui
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mogui.modules import (  # noqa: E402  # pylint: disable=wrong-import-position
+    Module,
+    parse_avail_json_line,
+)
+
+MODULEPATHS = [f"/apps/modulefiles/{area}" for area in ("core", "libs", "tools")]
+SIZES = [10000, 50000, 100000]
+
+
+class DictModule:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Module object storing its attributes in __dict__, for comparison"""
+
+    def __init__(self, name, symbols, modulepath, **details):
+        self.name = name
+        self.symbols = symbols
+        self.modulepath = modulepath
+        self.tags = details["tags"] or []
+        self.module_type = details["module_type"]
+        self.pathname = details["pathname"]
+        self.target = details["target"]
+        self.whatis = None
+        self.help_message = None
+        self.display_message = None
+
+
+def iter_avail_json_lines(count):
+    """Yield lines of avail JSON output reporting given number of modules"""
+    per_path = count // len(MODULEPATHS)
+    for path_index, modulepath in enumerate(MODULEPATHS):
+        yield json.dumps(modulepath) + ": {"
+        for i in range(path_index * per_path, (path_index + 1) * per_path):
+            name = f"soft{i // 10}/{i % 10}.{i % 3}.0"
+            entry = {
+                "name": name,
+                "type": "modulefile",
+                "symbols": ["default"] if i % 10 == 9 else [],
+                "tags": ["sticky"] if i % 50 == 0 else [],
+                "pathname": f"{modulepath}/{name}",
+            }
+            yield json.dumps(name) + ": " + json.dumps(entry) + ","
+        yield "},"
+
+
+def build_avail_mods(count, module_class):
+    """Return table of module objects built from avail JSON output"""
+    avail_mods = {}
+    modulepath = None
+    for line in iter_avail_json_lines(count):
+        parsed = parse_avail_json_line(line)
+        if parsed is None:
+            continue
+        name, entry = parsed
+        if entry is None:
+            modulepath = name
+            continue
+        avail_mods[name] = module_class(
+            name,
+            entry["symbols"] or None,
+            modulepath,
+            tags=entry["tags"],
+            module_type=entry["type"],
+            pathname=entry["pathname"],
+            target=entry.get("target"),
+        )
+    return avail_mods
+
+
+def measure(count, module_class):
+    """Return memory in bytes allocated to hold table of given size"""
+    tracemalloc.start()
+    avail_mods = build_avail_mods(count, module_class)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(avail_mods) == count // len(MODULEPATHS) * len(MODULEPATHS)
+    return size
+
+
+def main():
+    """Report memory footprint of each module table size"""
+    print(f"{'modules':>8} {'Module':>12} {'dict-based':>12} {'per module':>16}")
+    for count in SIZES:
+        slots_size = measure(count, Module)
+        dict_size = measure(count, DictModule)
+        per_module = f"{slots_size // count}B / {dict_size // count}B"
+        print(
+            f"{count:>8} {slots_size / 2**20:>10.1f}MB {dict_size / 2**20:>10.1f}MB"
+            f" {per_module:>16}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())